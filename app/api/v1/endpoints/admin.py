@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Body
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
+from fastapi.status import HTTP_500_INTERNAL_SERVER_ERROR
 from typing import Dict, Any, Optional, List
 import uuid
-import io
-import csv
 import json
 from datetime import datetime, timedelta
 import re
@@ -11,10 +11,11 @@ import os
 from datetime import datetime, timedelta
 from app.middlewares.ip_whitelist import ip_access_attempts
 
+from app.core.cache import invalidate_merchant_cache
 from app.core.security import get_current_active_superuser
 from app.schemas.auth import UserInDB
 from app.services.payment_service import (
-    get_pending_payments,
+    get_pending_payments_with_merchant,
     verify_payment,
     decline_payment
 )
@@ -26,8 +27,9 @@ from app.services.bank_statement_service import (
 from app.services.report_service import (
     get_payment_stats,
     get_merchant_reports,
-    generate_payments_csv,
-    get_merchant_commission_report
+    stream_payments_csv,
+    get_merchant_commission_report,
+    EXPORT_DEFAULT_DAYS
 )
 from app.services.admin_service import (
     get_users,
@@ -101,20 +103,28 @@ async def update_existing_user(
 async def list_pending_payments(
         merchant_id: Optional[uuid.UUID] = None,
         days: int = Query(7, description="Number of days to look back"),
+        limit: int = Query(50, ge=1, le=500, description="Page size"),
+        cursor_created_at: Optional[datetime] = None,
+        cursor_id: Optional[uuid.UUID] = None,
         current_user: UserInDB = Depends(get_current_active_superuser)
 ):
     """
-    Get all pending payments, optionally filtered by merchant
+    Get pending payments, optionally filtered by merchant, newest first
+    While has_more is true, pass next_cursor_created_at / next_cursor_id back
+    as cursor_created_at / cursor_id to fetch the next page.
     """
-    payments = get_pending_payments(
+    payments = get_pending_payments_with_merchant(
         merchant_id=str(merchant_id) if merchant_id else None,
-        days=days
+        days=days,
+        limit=limit,
+        cursor_created_at=cursor_created_at,
+        cursor_id=str(cursor_id) if cursor_id else None
     )
     return payments
 
 
 @router.post("/verify-payment/{payment_id}")
-async def admin_verify_payment(
+def admin_verify_payment(
         payment_id: uuid.UUID,
         utr_number: str = Body(...),
         remarks: Optional[str] = Body(None),
@@ -122,6 +132,7 @@ async def admin_verify_payment(
 ):
     """
     Verify a payment (mark as CONFIRMED)
+    Plain def so FastAPI runs the blocking DB work in its threadpool.
     """
     try:
         result = verify_payment(
@@ -140,13 +151,14 @@ async def admin_verify_payment(
 
 
 @router.post("/decline-payment/{payment_id}")
-async def admin_decline_payment(
+def admin_decline_payment(
         payment_id: uuid.UUID,
         remarks: str = Body(...),
         current_user: UserInDB = Depends(get_current_active_superuser)
 ):
     """
     Decline a payment
+    Plain def so FastAPI runs the blocking DB work in its threadpool.
     """
     try:
         result = decline_payment(
@@ -217,41 +229,43 @@ async def export_payments_csv(
         merchant_id: Optional[uuid.UUID] = None,
         payment_type: Optional[str] = None,
         status: Optional[str] = None,
-        start_date: Optional[datetime] = None,
+        start_date: Optional[datetime] = Query(
+            None,
+            description=f"Defaults to {EXPORT_DEFAULT_DAYS} days ago when no merchant_id is given"
+        ),
         end_date: Optional[datetime] = None,
         current_user: UserInDB = Depends(get_current_active_superuser)
 ):
     """
     Export payments as CSV
-    """
-    # Generate CSV data
-    csv_data = generate_payments_csv(
-        merchant_id=str(merchant_id) if merchant_id else None,
-        payment_type=payment_type,
-        status=status,
-        start_date=start_date,
-        end_date=end_date
-    )
-
-    # Create in-memory file
-    output = io.StringIO()
-    writer = csv.writer(output)
-
-    # Write header row
-    writer.writerow(csv_data["headers"])
 
-    # Write data rows
-    for row in csv_data["rows"]:
-        writer.writerow(row)
+    Without a merchant_id or start_date only the last 90 days
+    (EXPORT_DEFAULT_DAYS) are exported.
+    """
+    if start_date is None and merchant_id is None:
+        start_date = datetime.now() - timedelta(days=EXPORT_DEFAULT_DAYS)
 
-    # Prepare response
-    output.seek(0)
+    try:
+        # The database writes the CSV before the response starts, off the event loop
+        csv_stream = await run_in_threadpool(
+            stream_payments_csv,
+            merchant_id=str(merchant_id) if merchant_id else None,
+            payment_type=payment_type,
+            status=status,
+            start_date=start_date,
+            end_date=end_date
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error generating CSV: {str(e)}"
+        )
 
     # Format filename with current date
     filename = f"payments_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
 
     return StreamingResponse(
-        io.StringIO(output.getvalue()),
+        csv_stream,
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -508,12 +522,22 @@ async def get_pending_ips(
 async def list_merchants(
         skip: int = 0,
         limit: int = 100,
+        cursor_created_at: Optional[datetime] = None,
+        cursor_id: Optional[uuid.UUID] = None,
         current_user: UserInDB = Depends(get_current_active_superuser)
 ):
     """
     List all merchants
+
+    Pass the created_at and id of the last merchant received as
+    cursor_created_at / cursor_id to fetch the next page.
     """
-    merchants = get_merchants(skip=skip, limit=limit)
+    merchants = get_merchants(
+        skip=skip,
+        limit=limit,
+        cursor_created_at=cursor_created_at,
+        cursor_id=str(cursor_id) if cursor_id else None
+    )
     return merchants
 
 
@@ -636,6 +660,8 @@ async def add_ip_to_whitelist(
             single=True
         )
 
+        invalidate_merchant_cache(merchant_id)
+
         return {
             "id": result["id"],
             "merchant_id": str(merchant_id),
@@ -680,6 +706,8 @@ async def remove_ip_from_whitelist(
                 detail="IP not found in whitelist"
             )
 
+        invalidate_merchant_cache(merchant_id)
+
         return {
             "message": "IP removed from whitelist",
             "ip_address": result["ip_address"]
@@ -766,6 +794,8 @@ async def update_merchant_commission(
                 detail="Merchant not found"
             )
 
+        invalidate_merchant_cache(merchant_id)
+
         return {
             "id": result["id"],
             "business_name": result["business_name"],
@@ -3,6 +3,7 @@ from typing import Dict, Any, Optional, List
 import uuid
 from datetime import datetime, timedelta
 
+from app.core.cache import invalidate_merchant_cache
 from app.core.security import get_api_key_merchant
 from app.db.connection import execute_query
 
@@ -123,6 +124,7 @@ async def update_merchant_profile(
 
         # Execute update
         execute_query(update_query, tuple(params), fetch=False)
+        invalidate_merchant_cache(merchant["id"])
 
         # Return updated profile
         return await get_merchant_profile(merchant)
@@ -356,6 +358,8 @@ async def update_merchant_upi_details(
 
                 execute_query(insert_query, insert_params, fetch=False)
 
+        invalidate_merchant_cache(merchant["id"])
+
         # Get updated UPI details
         return await get_all_merchant_upi_details(merchant)
     except Exception as e:
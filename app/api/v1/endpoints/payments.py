@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, status, Body
+from fastapi.responses import ORJSONResponse
 from typing import Dict, Any, Optional, List
 import uuid
 
@@ -20,7 +21,13 @@ from app.schemas.payment import (
 router = APIRouter()
 
 
-@router.post("/request", response_model=PaymentResponse)
+# Only the fields built for the payment type are sent, not every schema field
+@router.post(
+    "/request",
+    response_model=PaymentResponse,
+    response_model_exclude_unset=True,
+    response_class=ORJSONResponse
+)
 async def api_create_payment_request(
         request: Request,
         payment_data: PaymentRequest = Body(...),
@@ -45,7 +52,7 @@ async def api_create_payment_request(
         )
 
 
-@router.post("/check-request", response_model=CheckRequestResponse)
+@router.post("/check-request", response_model=CheckRequestResponse, response_class=ORJSONResponse)
 async def api_check_payment_request(
         trxn_hash_key: str = Body(..., embed=True),
         merchant: Dict[str, Any] = Depends(get_api_key_merchant)
@@ -1,13 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import StreamingResponse
+from fastapi.status import HTTP_500_INTERNAL_SERVER_ERROR
 from typing import Dict, Any, Optional, List
 import uuid
 from datetime import datetime, timedelta
-import io
-import csv
 
 from app.core.security import get_api_key_merchant
-from app.services.report_service import get_merchant_reports, generate_payments_csv
+from app.services.report_service import get_merchant_reports, stream_payments_csv
 
 router = APIRouter()
 
@@ -20,10 +20,15 @@ async def get_merchant_payments(
         payment_type: Optional[str] = None,
         page: int = Query(1, ge=1),
         page_size: int = Query(20, ge=1, le=100),
+        cursor_created_at: Optional[datetime] = None,
+        cursor_id: Optional[uuid.UUID] = None,
         merchant: Dict[str, Any] = Depends(get_api_key_merchant)
 ):
     """
     Get merchant payments with pagination and filtering
+
+    Pass the created_at and id of the last payment received as
+    cursor_created_at / cursor_id to fetch the next page without a total count.
     """
     try:
         result = get_merchant_reports(
@@ -33,7 +38,9 @@ async def get_merchant_payments(
             status=status,
             payment_type=payment_type,
             page=page,
-            page_size=page_size
+            page_size=page_size,
+            cursor_created_at=cursor_created_at,
+            cursor_id=str(cursor_id) if cursor_id else None
         )
 
         return result
@@ -56,43 +63,32 @@ async def download_merchant_payments_csv(
     Download merchant payments as CSV
     """
     try:
-        # Generate CSV data
-        csv_data = generate_payments_csv(
+        # The database writes the CSV before the response starts, off the event
+        # loop, so errors still become an HTTP error
+        csv_stream = await run_in_threadpool(
+            stream_payments_csv,
             merchant_id=merchant["id"],
             payment_type=payment_type,
             status=status,
             start_date=start_date,
             end_date=end_date
         )
-
-        # Create in-memory file
-        output = io.StringIO()
-        writer = csv.writer(output)
-
-        # Write header row
-        writer.writerow(csv_data["headers"])
-
-        # Write data rows
-        for row in csv_data["rows"]:
-            writer.writerow(row)
-
-        # Prepare response
-        output.seek(0)
-
-        # Format filename with current date
-        filename = f"payments_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-
-        return StreamingResponse(
-            io.StringIO(output.getvalue()),
-            media_type="text/csv",
-            headers={"Content-Disposition": f"attachment; filename={filename}"}
-        )
     except Exception as e:
+        # status is the query parameter here, not fastapi.status
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            status_code=HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error generating CSV: {str(e)}"
         )
 
+    # Format filename with current date
+    filename = f"payments_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+
+    return StreamingResponse(
+        csv_stream,
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 
 @router.get("/statistics")
 async def get_merchant_statistics(
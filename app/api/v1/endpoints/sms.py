@@ -1,9 +1,9 @@
 from fastapi import APIRouter, Body, HTTPException, status, Depends, Request
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import logging
 
 from app.schemas.sms import SMSPayload
-from app.services.sms_service import process_bank_sms
+from app.services.sms_service import process_bank_sms, process_bank_sms_batch
 from app.api.v1.dependencies import verify_sms_source
 
 router = APIRouter()
@@ -18,7 +18,7 @@ async def process_sms(
     """
     Process a forwarded bank SMS message, extract transaction details,
     and update payment status if matched with a pending transaction.
-    
+
     The SMS should contain information about the transaction such as:
     - UTR number
     - Amount
@@ -31,13 +31,13 @@ async def process_sms(
             message=sms_data.message,
             timestamp=sms_data.timestamp
         )
-        
+
         return {
             "status": "success",
             "message": "SMS processed successfully",
             "details": result
         }
-        
+
     except ValueError as e:
         logger.warning(f"SMS processing error: {str(e)}")
         raise HTTPException(
@@ -49,4 +49,34 @@ async def process_sms(
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to process SMS message"
-        )
\ No newline at end of file
+        )
+
+
+# Plain def so the blocking batch runs in the threadpool
+@router.post("/process-sms-batch")
+def process_sms_batch(
+    request: Request,
+    sms_batch: List[SMSPayload] = Body(...),
+    verified: bool = Depends(verify_sms_source)
+):
+    """
+    Process a batch of forwarded bank SMS messages in one request.
+
+    Pending transactions for all amounts in the batch are looked up at once;
+    each message gets its own result, in the order sent.
+    """
+    try:
+        results = process_bank_sms_batch([sms_data.dict() for sms_data in sms_batch])
+
+        return {
+            "status": "success",
+            "message": f"{len(results)} SMS processed successfully",
+            "details": results
+        }
+
+    except Exception as e:
+        logger.error(f"Unexpected error processing SMS batch: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Failed to process SMS messages"
+        )
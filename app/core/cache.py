@@ -0,0 +1,247 @@
+# app/core/cache.py
+
+import json
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import redis
+from cachetools import TTLCache
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# These caches are per process. Redis carries invalidations across workers
+# (see merchant_cache_key and get_cached_api_key_merchant); while Redis is
+# unreachable, deactivations and key rotations reach other workers within
+# this many seconds.
+MERCHANT_CACHE_TTL = 5
+
+# Merchant details keyed by merchant ID (see merchant_service.get_merchant_details)
+merchant_cache: TTLCache = TTLCache(maxsize=1024, ttl=MERCHANT_CACHE_TTL)
+
+# Merchant auth rows keyed by API key (see security.get_api_key_merchant)
+api_key_cache: TTLCache = TTLCache(maxsize=1024, ttl=MERCHANT_CACHE_TTL)
+
+# Payment limits and webhook settings keyed by merchant ID (see payment_service._get_merchant)
+payment_merchant_cache: TTLCache = TTLCache(maxsize=10_000, ttl=MERCHANT_CACHE_TTL)
+
+# Admin dashboard statistics keyed by look-back days (see report_service.get_payment_stats)
+payment_stats_cache: TTLCache = TTLCache(maxsize=32, ttl=60)
+
+# cachetools caches are not thread-safe on their own
+cache_lock = threading.RLock()
+
+# Shared API key -> merchant mapping in Redis, so every worker process benefits
+API_KEY_REDIS_TTL = 60
+API_KEY_REDIS_PREFIX = "apikey:"
+MERCHANT_API_KEY_REDIS_PREFIX = "apikey_of:"
+
+# Per-merchant version bumped on every invalidation; in-process merchant
+# entries are keyed by it, so a bump from any worker retires them everywhere
+MERCHANT_VERSION_REDIS_PREFIX = "merchant_version:"
+
+# Versions read from Redis are reused for this many seconds, so a cache hit
+# costs a Redis round trip at most once a second per merchant
+MERCHANT_VERSION_LOCAL_TTL = 1
+merchant_version_cache: TTLCache = TTLCache(maxsize=10_000, ttl=MERCHANT_VERSION_LOCAL_TTL)
+
+# Seconds to stop calling Redis after an error, so an outage costs one
+# socket timeout per interval instead of one per lookup
+REDIS_RETRY_AFTER = 5
+
+_redis_client: Optional[redis.Redis] = None
+_redis_down_until = 0.0
+
+
+def get_redis_client() -> redis.Redis:
+    """
+    Get the shared Redis client used for caching
+
+    Short timeouts keep an unavailable Redis from stalling authentication;
+    callers treat Redis errors as cache misses.
+    """
+    global _redis_client
+
+    if _redis_client is None:
+        _redis_client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            db=settings.REDIS_DB,
+            socket_timeout=0.1,
+            socket_connect_timeout=0.1
+        )
+
+    return _redis_client
+
+
+def _redis_backing_off() -> bool:
+    """
+    Check whether Redis failed recently and should not be called yet
+    """
+    return time.monotonic() < _redis_down_until
+
+
+def _redis_failed(e: redis.RedisError, what: str) -> None:
+    """
+    Log a Redis error and back off from Redis for REDIS_RETRY_AFTER seconds
+    """
+    global _redis_down_until
+
+    _redis_down_until = time.monotonic() + REDIS_RETRY_AFTER
+    logger.warning(f"Redis {what} unavailable: {e}")
+
+
+def get_merchant_cache_version(merchant_id: Any) -> Optional[int]:
+    """
+    Get the shared cache version of a merchant
+
+    Parameters:
+    - merchant_id: Merchant ID
+
+    Returns:
+    - Current version, or None if Redis is unavailable
+    """
+    merchant_id = str(merchant_id)
+
+    with cache_lock:
+        version = merchant_version_cache.get(merchant_id)
+
+    if version is not None:
+        return version
+
+    if _redis_backing_off():
+        return None
+
+    try:
+        version = get_redis_client().get(MERCHANT_VERSION_REDIS_PREFIX + merchant_id)
+    except redis.RedisError as e:
+        _redis_failed(e, "merchant cache version")
+        return None
+
+    version = int(version) if version is not None else 0
+
+    with cache_lock:
+        merchant_version_cache[merchant_id] = version
+
+    return version
+
+
+def merchant_cache_key(merchant_id: Any) -> Tuple[str, Optional[int]]:
+    """
+    Build the in-process cache key for a merchant entry
+
+    Entries cached under an older version are never hit again once the
+    version memo expires (MERCHANT_VERSION_LOCAL_TTL). While Redis is
+    unreachable the version is None and entries fall back to MERCHANT_CACHE_TTL.
+
+    Parameters:
+    - merchant_id: Merchant ID
+
+    Returns:
+    - (merchant ID, shared cache version)
+    """
+    return str(merchant_id), get_merchant_cache_version(merchant_id)
+
+
+def _get_local_api_key_merchant(api_key: str) -> Optional[Dict[str, Any]]:
+    # In-process fallback while Redis is unreachable
+    with cache_lock:
+        merchant = api_key_cache.get(api_key)
+
+    # Hand out a copy so callers can't modify the cached row
+    return dict(merchant) if merchant is not None else None
+
+
+def get_cached_api_key_merchant(api_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up a merchant auth row by API key in Redis
+
+    Redis is checked first so an invalidation from any worker takes effect
+    everywhere; the in-process cache is only used while Redis is unreachable.
+
+    Parameters:
+    - api_key: API key from request header
+
+    Returns:
+    - Merchant auth row, or None on a cache miss
+    """
+    try:
+        if _redis_backing_off():
+            return _get_local_api_key_merchant(api_key)
+
+        cached_value = get_redis_client().get(API_KEY_REDIS_PREFIX + api_key)
+    except redis.RedisError as e:
+        _redis_failed(e, "API key cache")
+        return _get_local_api_key_merchant(api_key)
+
+    if cached_value is None:
+        return None
+
+    merchant = json.loads(cached_value)
+
+    with cache_lock:
+        api_key_cache[api_key] = merchant
+
+    return dict(merchant)
+
+
+def cache_api_key_merchant(api_key: str, merchant: Dict[str, Any]) -> None:
+    """
+    Store a merchant auth row in the in-process cache and Redis
+
+    Parameters:
+    - api_key: API key from request header
+    - merchant: Merchant auth row
+    """
+    with cache_lock:
+        api_key_cache[api_key] = dict(merchant)
+
+    if _redis_backing_off():
+        return
+
+    try:
+        pipe = get_redis_client().pipeline()
+        pipe.setex(API_KEY_REDIS_PREFIX + api_key, API_KEY_REDIS_TTL, json.dumps(merchant, default=str))
+        # Reverse mapping so the entry can be invalidated by merchant ID
+        pipe.setex(MERCHANT_API_KEY_REDIS_PREFIX + str(merchant["id"]), API_KEY_REDIS_TTL, api_key)
+        pipe.execute()
+    except redis.RedisError as e:
+        _redis_failed(e, "API key cache")
+
+
+def invalidate_merchant_cache(merchant_id: Any) -> None:
+    """
+    Drop every cached entry belonging to a merchant
+
+    Parameters:
+    - merchant_id: Merchant ID
+    """
+    merchant_id = str(merchant_id)
+
+    with cache_lock:
+        merchant_version_cache.pop(merchant_id, None)
+
+        for cache in (merchant_cache, payment_merchant_cache):
+            for key in list(cache.keys()):
+                if key[0] == merchant_id:
+                    cache.pop(key, None)
+
+        for api_key, merchant in list(api_key_cache.items()):
+            if str(merchant["id"]) == merchant_id:
+                api_key_cache.pop(api_key, None)
+
+    # Always attempted, even while backing off: invalidations are rare and
+    # other workers depend on the version bump
+    try:
+        client = get_redis_client()
+        # Retire this merchant's in-process entries on every other worker
+        client.incr(MERCHANT_VERSION_REDIS_PREFIX + merchant_id)
+        api_key = client.get(MERCHANT_API_KEY_REDIS_PREFIX + merchant_id)
+
+        if api_key is not None:
+            client.delete(API_KEY_REDIS_PREFIX + api_key.decode(), MERCHANT_API_KEY_REDIS_PREFIX + merchant_id)
+    except redis.RedisError as e:
+        _redis_failed(e, "API key cache")
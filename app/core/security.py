@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
-from typing import Any, Dict, Optional, Union
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Union
+import os
 import secrets
 import string
 import hashlib
@@ -12,8 +14,9 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer, APIKeyHeader
 from pydantic import ValidationError
 
+from app.core.cache import get_cached_api_key_merchant, cache_api_key_merchant
 from app.core.config import settings
-from app.db.connection import execute_query
+from app.db.connection import execute_query, prepare_statement, execute_prepared
 from app.schemas.auth import TokenPayload, UserInDB
 
 # Setup logging
@@ -28,6 +31,17 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login
 # API Key scheme
 api_key_header = APIKeyHeader(name="X-API-Key")
 
+# Merchant lookup run on every API-key authenticated request
+MERCHANT_BY_API_KEY = prepare_statement("merchant_by_api_key", """
+    SELECT 
+        m.id, m.business_name, m.is_active, m.callback_url, m.webhook_secret,
+        m.min_deposit, m.max_deposit, m.min_withdrawal, m.max_withdrawal
+    FROM 
+        merchants m
+    WHERE 
+        m.api_key = %s
+""")
+
 
 def create_access_token(subject: Union[str, Any], expires_delta: timedelta = None) -> str:
     """
@@ -90,6 +104,52 @@ def generate_api_key() -> str:
     return api_key
 
 
+def generate_api_keys(count: int) -> List[str]:
+    """
+    Generate many random API keys at once, for bulk merchant creation
+
+    Keys look exactly like generate_api_key's, but the randomness is read
+    from the OS in a few large chunks instead of one call per character.
+
+    Parameters:
+    - count: Number of API keys to generate
+
+    Returns:
+    - List of random API key strings
+    """
+    alphabet = string.ascii_letters + string.digits
+    # Bytes at or above the largest multiple of the alphabet size are
+    # rejected, so every character stays uniformly distributed
+    limit = 256 - 256 % len(alphabet)
+    needed = count * 32
+    characters = []
+
+    while len(characters) < needed:
+        characters.extend(
+            alphabet[byte % len(alphabet)]
+            for byte in os.urandom(needed - len(characters) + 64)
+            if byte < limit
+        )
+
+    key_characters = ''.join(characters[:needed])
+    return [key_characters[i:i + 32] for i in range(0, needed, 32)]
+
+
+@lru_cache(maxsize=1024)
+def _webhook_hmac_template(secret: str) -> hmac.HMAC:
+    """
+    Get an HMAC-SHA256 keyed with the merchant's webhook secret
+    Callers copy() it, so the key pads are derived once per secret.
+
+    Parameters:
+    - secret: Merchant's webhook secret
+
+    Returns:
+    - Keyed HMAC object with no data fed in
+    """
+    return hmac.new(secret.encode(), digestmod=hashlib.sha256)
+
+
 def generate_webhook_signature(payload: Dict[str, Any], secret: str) -> str:
     """
     Generate HMAC signature for webhook payloads
@@ -104,14 +164,11 @@ def generate_webhook_signature(payload: Dict[str, Any], secret: str) -> str:
     # Convert payload to string
     payload_str = str(sorted([(k, v) for k, v in payload.items()]))
 
-    # Create HMAC signature
-    signature = hmac.new(
-        secret.encode(),
-        payload_str.encode(),
-        hashlib.sha256
-    ).hexdigest()
+    # Create HMAC signature from the cached keyed template
+    mac = _webhook_hmac_template(secret).copy()
+    mac.update(payload_str.encode())
 
-    return signature
+    return mac.hexdigest()
 
 
 def verify_webhook_signature(
@@ -214,6 +271,28 @@ async def get_current_active_superuser(current_user: UserInDB = Depends(get_curr
     return current_user
 
 
+def get_merchant_by_api_key(api_key: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up the merchant owning an API key, serving from cache when possible
+
+    Parameters:
+    - api_key: API key
+
+    Returns:
+    - Merchant auth row, or None if the key is unknown
+    """
+    merchant = get_cached_api_key_merchant(api_key)
+
+    if merchant is None:
+        merchant = execute_prepared(MERCHANT_BY_API_KEY, (api_key,), single=True)
+
+        # Only cache valid keys so bogus keys can't evict real merchants
+        if merchant:
+            cache_api_key_merchant(api_key, merchant)
+
+    return merchant
+
+
 async def get_api_key_merchant(api_key: str = Depends(api_key_header)):
     """
     Get merchant from API key
@@ -227,16 +306,7 @@ async def get_api_key_merchant(api_key: str = Depends(api_key_header)):
     Raises:
     - HTTPException: If API key is invalid or merchant not found
     """
-    query = """
-    SELECT 
-        m.id, m.business_name, m.is_active, m.callback_url, m.webhook_secret,
-        m.min_deposit, m.max_deposit, m.min_withdrawal, m.max_withdrawal
-    FROM 
-        merchants m
-    WHERE 
-        m.api_key = %s
-    """
-    merchant = execute_query(query, (api_key,), single=True)
+    merchant = get_merchant_by_api_key(api_key)
 
     if not merchant:
         raise HTTPException(
@@ -108,17 +108,26 @@
 
 import psycopg2
 from psycopg2 import pool
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 from contextlib import contextmanager
 from app.core.config import settings
 import logging
 import atexit
+import csv
+import io
+import re
+import threading
+import uuid
+import weakref
 
 logger = logging.getLogger(__name__)
 
 # Create a global connection pool that will be shared across the application
 connection_pool = None
 
+# Guards lazy pool creation when several threads hit the database at once
+_pool_lock = threading.Lock()
+
 
 def initialize_connection_pool():
     """Initialize the PostgreSQL connection pool."""
@@ -148,6 +157,14 @@ def close_connection_pool():
         logger.info("PostgreSQL connection pool closed")
 
 
+# Statements registered with prepare_statement():
+# name -> (SQL with $n placeholders, parameter count, parameter names for %(name)s queries)
+prepared_statements = {}
+
+# Names already PREPAREd on each pooled connection
+_prepared_on_connection = weakref.WeakKeyDictionary()
+
+
 # Register the close_connection_pool function to run when the application exits
 atexit.register(close_connection_pool)
 
@@ -164,7 +181,9 @@ def get_db_connection():
 
     # Initialize the connection pool if it doesn't exist yet
     if connection_pool is None:
-        initialize_connection_pool()
+        with _pool_lock:
+            if connection_pool is None:
+                initialize_connection_pool()
 
     conn = None
     try:
@@ -248,4 +267,180 @@ def execute_transaction(queries):
         except Exception as e:
             conn.rollback()
             logger.error(f"Transaction error: {e}")
-            raise
\ No newline at end of file
+            raise
+
+
+def execute_values_query(query, argslist, template=None, fetch=False, page_size=100):
+    """
+    Execute a multi-row SQL statement with psycopg2's execute_values
+
+    Parameters:
+    - query: SQL query string containing a single VALUES %s placeholder
+    - argslist: Sequence of parameter tuples, one per row
+    - template: Optional row template (e.g. "(%s, %s, DEFAULT)")
+    - fetch: Whether to fetch results (for RETURNING clauses)
+    - page_size: Maximum number of rows per statement sent to the server
+
+    Returns:
+    - Query results if fetch is True
+    - Row count otherwise
+    """
+    with get_db_cursor(commit=True) as cursor:
+        result = execute_values(cursor, query, argslist, template=template, page_size=page_size, fetch=fetch)
+
+        if fetch:
+            return result
+
+        return cursor.rowcount
+
+
+
+def stream_query(query, params=None, batch_size=1000):
+    """
+    Stream the results of a SQL query through a server-side (named) cursor
+
+    Rows are fetched from PostgreSQL in batches, so the full result set is
+    never materialized in memory.
+
+    Parameters:
+    - query: SQL query string
+    - params: Parameters for the query
+    - batch_size: Number of rows fetched per round-trip
+
+    Yields:
+    - One row (dict) at a time
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}", cursor_factory=RealDictCursor)
+        cursor.itersize = batch_size
+        try:
+            cursor.execute(query, params or {})
+
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            cursor.close()
+            # Named cursors live inside a transaction; end it before reuse
+            conn.rollback()
+
+
+
+def copy_to(query, file, params=None, options="CSV HEADER"):
+    """
+    Write the result of a SQL query to a file with COPY ... TO STDOUT
+
+    PostgreSQL formats the rows itself, so no per-row work happens in Python.
+
+    Parameters:
+    - query: SQL query string (literal percent signs doubled)
+    - file: Writable file object (binary)
+    - params: Parameters for the query
+    - options: COPY options
+    """
+    with get_db_cursor() as cursor:
+        copy_query = cursor.mogrify(f"COPY ({query}) TO STDOUT WITH {options}", params or ())
+        cursor.copy_expert(copy_query, file)
+
+
+
+def copy_from(table, columns, rows):
+    """
+    Bulk load rows into a table with COPY ... FROM STDIN
+
+    The rows are streamed to PostgreSQL as CSV in one COPY, with no per-row
+    parse, plan or round trip. None is loaded as NULL (and so is an empty
+    string, as usual for CSV COPY).
+
+    Parameters:
+    - table: Table name
+    - columns: Column names, in the same order as each row's values
+    - rows: Iterable of row tuples
+
+    Returns:
+    - Number of rows loaded
+    """
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    buffer.seek(0)
+
+    with get_db_cursor(commit=True) as cursor:
+        cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH CSV", buffer)
+        return cursor.rowcount
+
+
+def prepare_statement(name, query):
+    """
+    Register a statement to be PREPAREd once per pooled connection
+
+    Parameters:
+    - name: Statement name (must be a valid SQL identifier)
+    - query: SQL query string using %s or %(name)s placeholders
+
+    Returns:
+    - The statement name, for use with execute_prepared
+    """
+    param_names = []
+
+    if "%(" in query:
+        # Named placeholders: each distinct name gets one $n, params come as a dict
+        def to_position(match):
+            if match.group(1) not in param_names:
+                param_names.append(match.group(1))
+            return f"${param_names.index(match.group(1)) + 1}"
+
+        sql = re.sub(r"%\((\w+)\)s", to_position, query)
+        prepared_statements[name] = (sql, len(param_names), param_names)
+        return name
+
+    parts = query.split("%s")
+    sql = parts[0]
+    for position, part in enumerate(parts[1:], start=1):
+        sql += f"${position}{part}"
+
+    prepared_statements[name] = (sql, len(parts) - 1, None)
+    return name
+
+
+def execute_prepared(name, params=None, fetch=True, single=False, commit=True):
+    """
+    Execute a statement registered with prepare_statement
+
+    The statement is parsed and planned by PostgreSQL the first time it is
+    used on a connection; later calls only send EXECUTE with the parameters.
+
+    Parameters:
+    - name: Statement name
+    - params: Parameters for the query (a dict for %(name)s statements)
+    - fetch: Whether to fetch results (SELECT) or not (INSERT/UPDATE/DELETE)
+    - single: Whether to fetch a single row or all rows
+    - commit: Whether to commit the transaction
+
+    Returns:
+    - Query results for SELECT queries
+    - Row count for INSERT/UPDATE/DELETE queries
+    """
+    query, param_count, param_names = prepared_statements[name]
+
+    if param_names:
+        params = tuple(params[param_name] for param_name in param_names)
+
+    with get_db_cursor(commit=commit) as cursor:
+        prepared = _prepared_on_connection.setdefault(cursor.connection, set())
+        if name not in prepared:
+            cursor.execute(f"PREPARE {name} AS {query}")
+            prepared.add(name)
+
+        if param_count:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * param_count)})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+
+        if fetch:
+            if single:
+                return cursor.fetchone()
+            return cursor.fetchall()
+
+        return cursor.rowcount
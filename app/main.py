@@ -11,7 +11,16 @@ from app.core.security import get_current_active_superuser
 from app.api.v1.api import api_router
 from app.middlewares.ip_whitelist import IPWhitelistMiddleware
 from app.middlewares.rate_limiter import RateLimiterMiddleware
-from app.services.webhook_service import process_failed_webhooks
+from app.services.webhook_service import (
+    process_failed_webhooks,
+    start_webhook_worker,
+    stop_webhook_worker
+)
+from app.services.report_service import (
+    refresh_report_views,
+    start_report_view_refresher,
+    stop_report_view_refresher
+)
 from app.db.connection import initialize_connection_pool
 
 # Configure logging
@@ -33,11 +42,19 @@ async def lifespan(app: FastAPI):
     # Startup: create upload directories
     logger.info("Starting up application")
 
+    # Start the webhook dispatch worker
+    await start_webhook_worker()
+
+    # Keep the dashboard's materialized views fresh
+    await start_report_view_refresher()
+
     # Yield control back to FastAPI
     yield
 
     # Shutdown: cleanup
     logger.info("Shutting down application")
+    await stop_report_view_refresher()
+    await stop_webhook_worker()
 
 
 # Create FastAPI app
@@ -110,6 +127,23 @@ async def run_process_failed_webhooks(request: Request):
     return {"status": "success", "message": "Failed webhooks processed"}
 
 
+# Scheduled task endpoint (on demand; the app also refreshes in the background)
+@app.post("/tasks/refresh-report-views")
+def run_refresh_report_views(request: Request):
+    # Simple API key check for cron job security
+    api_key = request.headers.get("X-API-Key")
+    if api_key != settings.SECRET_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid API key"
+        )
+
+    # Plain def so the refresh runs in the threadpool
+    refresh_report_views()
+
+    return {"status": "success", "message": "Report views refreshed"}
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
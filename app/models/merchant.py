@@ -1,3 +1,4 @@
+from dataclasses import dataclass
 from datetime import datetime
 from uuid import UUID
 from typing import Optional, List
@@ -248,4 +249,55 @@ class Merchant:
             "bank_details": [bd.to_dict() for bd in self.bank_details],
             "upi_details": [ud.to_dict() for ud in self.upi_details],
             "ip_whitelist": [ip.to_dict() for ip in self.ip_whitelist]
-        }
\ No newline at end of file
+        }
+
+
+@dataclass(slots=True)
+class MerchantUserSummary:
+    """User owning a merchant, as embedded in merchant listings"""
+    id: UUID
+    email: str
+    full_name: str
+
+
+@dataclass(slots=True)
+class MerchantListItem:
+    """Compact merchant row used by merchant listings (no per-row __dict__)"""
+    id: UUID
+    business_name: str
+    business_type: str
+    contact_phone: str
+    api_key: str
+    is_active: bool
+    callback_url: str
+    min_deposit: int
+    max_deposit: int
+    min_withdrawal: int
+    max_withdrawal: int
+    created_at: datetime
+    updated_at: datetime
+    user: MerchantUserSummary
+
+    @classmethod
+    def from_row(cls, row: dict):
+        """Create a MerchantListItem from a merchants JOIN users row"""
+        return cls(
+            id=row["id"],
+            business_name=row["business_name"],
+            business_type=row["business_type"],
+            contact_phone=row["contact_phone"],
+            api_key=row["api_key"],
+            is_active=row["is_active"],
+            callback_url=row["callback_url"],
+            min_deposit=row["min_deposit"],
+            max_deposit=row["max_deposit"],
+            min_withdrawal=row["min_withdrawal"],
+            max_withdrawal=row["max_withdrawal"],
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+            user=MerchantUserSummary(
+                id=row["user_id"],
+                email=row["email"],
+                full_name=row["full_name"]
+            )
+        )
@@ -44,16 +44,24 @@ class ReceiverUPIInfo(BaseModel):
 
 
 class ReceiverBankInfo(BaseModel):
-    bank: str
+    bank: Optional[str] = None
     bank_ifsc: Optional[str] = None
     account_name: Optional[str] = None
     account_number: Optional[str] = None
 
 
+class ReceiverDepositBankInfo(BaseModel):
+    bank_name: str
+    account_name: str
+    account_number: str
+    ifsc_code: str
+
+
 class PaymentResponseData(BaseModel):
     paymentMethod: Optional[str] = None
     receiverInfo: Optional[ReceiverUPIInfo] = None
-    receiverBankInfo: Optional[ReceiverBankInfo] = None
+    # Merchant's receiving account for bank deposits, player's account for withdrawals
+    receiverBankInfo: Optional[Union[ReceiverDepositBankInfo, ReceiverBankInfo]] = None
     upiLink: Optional[str] = None
     paymentPageUrl: Optional[str] = None
     trxnHashKey: str
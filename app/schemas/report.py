@@ -61,10 +61,11 @@ class PaymentResponse(BaseModel):
 class PaginatedPaymentResponse(BaseModel):
     """Paginated payment response for reports"""
     items: List[PaymentResponse] = Field(..., description="List of payments")
-    total: int = Field(..., description="Total number of items")
+    total: Optional[int] = Field(None, description="Total number of items (not counted for cursor pages)")
     page: int = Field(..., description="Current page number")
     page_size: int = Field(..., description="Number of items per page")
-    pages: int = Field(..., description="Total number of pages")
+    pages: Optional[int] = Field(None, description="Total number of pages (not counted for cursor pages)")
+    has_more: bool = Field(False, description="Whether another page follows")
 
 
 class BankStatementResponse(BaseModel):
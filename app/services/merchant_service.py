@@ -1,149 +1,180 @@
+import copy
 import logging
-from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 import uuid
 
+from cachetools import cached
+
+from app.core.cache import merchant_cache, merchant_cache_key, cache_lock, invalidate_merchant_cache
 from app.core.security import get_password_hash, generate_api_key
-from app.db.connection import execute_query, execute_transaction
+from app.db.connection import (
+    execute_query, execute_transaction, execute_values_query, stream_query,
+    prepare_statement, execute_prepared
+)
+from app.models.merchant import MerchantListItem
 
 logger = logging.getLogger(__name__)
 
+# Hot statements, parsed and planned once per pooled connection
 
-def get_merchants(skip: int = 0, limit: int = 100) -> List[Dict[str, Any]]:
-    """
-    Get all merchants
-
-    Parameters:
-    - skip: Number of records to skip
-    - limit: Maximum number of records to return
-
-    Returns:
-    - List of merchants
-    """
-    query = """
+# Merchant row plus its bank, UPI and IP whitelist rows in one round-trip
+# (psycopg2 has no pipeline mode, so the child lists are aggregated server-side)
+MERCHANT_DETAILS = prepare_statement("merchant_details_by_id", """
     SELECT 
         m.id, m.business_name, m.business_type, m.contact_phone,
-        m.api_key, m.is_active, m.callback_url,
+        m.address, m.api_key, m.is_active, m.callback_url, m.commission_rate,
         m.min_deposit, m.max_deposit, m.min_withdrawal, m.max_withdrawal,
         m.created_at, m.updated_at,
-        u.id as user_id, u.email, u.full_name
+        u.id as user_id, u.email, u.full_name,
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'id', b.id, 'bank_name', b.bank_name, 'account_name', b.account_name,
+                'account_number', b.account_number, 'ifsc_code', b.ifsc_code,
+                'is_active', b.is_active
+            ))
+            FROM merchant_bank_details b
+            WHERE b.merchant_id = m.id
+        ), '[]') as bank_details,
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'id', up.id, 'upi_id', up.upi_id, 'name', up.name, 'is_active', up.is_active
+            ))
+            FROM merchant_upi_details up
+            WHERE up.merchant_id = m.id
+        ), '[]') as upi_details,
+        COALESCE((
+            SELECT json_agg(json_build_object(
+                'id', ip.id, 'ip_address', ip.ip_address, 'description', ip.description
+            ))
+            FROM ip_whitelist ip
+            WHERE ip.merchant_id = m.id
+        ), '[]') as ip_whitelist
     FROM 
         merchants m
     JOIN 
         users u ON m.user_id = u.id
-    ORDER BY 
-        m.created_at DESC
-    LIMIT %s OFFSET %s
-    """
-
-    merchants = execute_query(query, (limit, skip))
+    WHERE 
+        m.id = %s
+""")
 
-    # Format response
-    result = []
-    for merchant in merchants:
-        result.append({
-            "id": merchant["id"],
-            "business_name": merchant["business_name"],
-            "business_type": merchant["business_type"],
-            "contact_phone": merchant["contact_phone"],
-            "api_key": merchant["api_key"],
-            "is_active": merchant["is_active"],
-            "callback_url": merchant["callback_url"],
-            "min_deposit": merchant["min_deposit"],
-            "max_deposit": merchant["max_deposit"],
-            "min_withdrawal": merchant["min_withdrawal"],
-            "max_withdrawal": merchant["max_withdrawal"],
-            "created_at": merchant["created_at"],
-            "updated_at": merchant["updated_at"],
-            "user": {
-                "id": merchant["user_id"],
-                "email": merchant["email"],
-                "full_name": merchant["full_name"]
-            }
-        })
+INSERT_BANK_DETAILS = prepare_statement("insert_merchant_bank_details", """
+    INSERT INTO merchant_bank_details (
+        merchant_id, bank_name, account_name, account_number, ifsc_code, is_active
+    ) VALUES (
+        %s, %s, %s, %s, %s, %s
+    )
+    RETURNING id, bank_name, account_name, account_number, ifsc_code, is_active
+""")
 
-    return result
+INSERT_UPI_DETAILS = prepare_statement("insert_merchant_upi_details", """
+    INSERT INTO merchant_upi_details (
+        merchant_id, upi_id, name, is_active
+    ) VALUES (
+        %s, %s, %s, %s
+    )
+    RETURNING id, upi_id, name, is_active
+""")
 
 
-def get_merchant_details(merchant_id: str) -> Optional[Dict[str, Any]]:
+def _as_list(details: Any) -> List[Dict[str, Any]]:
     """
-    Get merchant details
+    Normalize bank/UPI details that may be sent as a single object or a list
+    """
+    return [details] if isinstance(details, dict) else (details or [])
 
-    Parameters:
-    - merchant_id: Merchant ID
 
-    Returns:
-    - Merchant details
-    """
-    # Get merchant query]
-    query = """
-    SELECT 
-        m.id, m.business_name, m.business_type, m.contact_phone,
-        m.address, m.api_key, m.is_active, m.callback_url, m.commission_rate,
-        m.min_deposit, m.max_deposit, m.min_withdrawal, m.max_withdrawal,
-        m.created_at, m.updated_at,
-        u.id as user_id, u.email, u.full_name
-    FROM 
-        merchants m
-    JOIN 
-        users u ON m.user_id = u.id
-    WHERE 
-        m.id = %s
+MERCHANT_LIST_COLUMNS = """
+    m.id, m.business_name, m.business_type, m.contact_phone,
+    m.api_key, m.is_active, m.callback_url,
+    m.min_deposit, m.max_deposit, m.min_withdrawal, m.max_withdrawal,
+    m.created_at, m.updated_at,
+    u.id as user_id, u.email, u.full_name
+"""
+
+
+def get_merchants(
+        skip: int = 0,
+        limit: int = 100,
+        cursor_created_at: Optional[datetime] = None,
+        cursor_id: Optional[str] = None
+) -> List[MerchantListItem]:
     """
+    Get all merchants, newest first
 
-    merchant = execute_query(query, (merchant_id,), single=True)
+    Pages are keyset-paginated: pass the created_at and id of the last
+    merchant of the previous page as the cursor to fetch the next one.
 
-    if not merchant:
-        return None
+    Parameters:
+    - skip: Number of records to skip (legacy, only used without a cursor)
+    - limit: Maximum number of records to return
+    - cursor_created_at: created_at of the last merchant already returned
+    - cursor_id: id of the last merchant already returned
 
-    # Get bank details
-    bank_query = """
-    SELECT 
-        id, bank_name, account_name, account_number, ifsc_code, is_active
-    FROM 
-        merchant_bank_details
-    WHERE 
-        merchant_id = %s
+    Returns:
+    - List of merchants
     """
+    if cursor_created_at is not None and cursor_id is not None:
+        query = f"""
+        SELECT {MERCHANT_LIST_COLUMNS}
+        FROM 
+            merchants m
+        JOIN 
+            users u ON m.user_id = u.id
+        WHERE 
+            (m.created_at, m.id) < (%s, %s)
+        ORDER BY 
+            m.created_at DESC, m.id DESC
+        LIMIT %s
+        """
+        params = (cursor_created_at, cursor_id, limit)
+    else:
+        query = f"""
+        SELECT {MERCHANT_LIST_COLUMNS}
+        FROM 
+            merchants m
+        JOIN 
+            users u ON m.user_id = u.id
+        ORDER BY 
+            m.created_at DESC, m.id DESC
+        LIMIT %s OFFSET %s
+        """
+        params = (limit, skip)
 
-    bank_details = execute_query(bank_query, (merchant_id,))
+    merchants = execute_query(query, params)
 
-    # Get UPI details
-    upi_query = """
-    SELECT 
-        id, upi_id, name, is_active
-    FROM 
-        merchant_upi_details
-    WHERE 
-        merchant_id = %s
-    """
+    # Format response
+    return [MerchantListItem.from_row(merchant) for merchant in merchants]
 
-    upi_details = execute_query(upi_query, (merchant_id,))
 
-    # Get IP whitelist
-    ip_query = """
-    SELECT 
-        id, ip_address, description
-    FROM 
-        ip_whitelist
-    WHERE 
-        merchant_id = %s
+def iter_merchants(batch: int = 1000) -> Iterator[MerchantListItem]:
     """
+    Iterate over every merchant without loading them all into memory
 
-    ip_whitelist = execute_query(ip_query, (merchant_id,))
+    Parameters:
+    - batch: Number of rows fetched from the server per round-trip
 
-    # Get rate limits
-    rate_limit_query = """
-    SELECT 
-        id, endpoint, requests_per_minute
+    Yields:
+    - Merchants, newest first
+    """
+    query = f"""
+    SELECT {MERCHANT_LIST_COLUMNS}
     FROM 
-        rate_limits
-    WHERE 
-        merchant_id = %s
+        merchants m
+    JOIN 
+        users u ON m.user_id = u.id
+    ORDER BY 
+        m.created_at DESC, m.id DESC
     """
 
-    # rate_limits = execute_query(rate_limit_query, (merchant_id,))
+    for merchant in stream_query(query, batch_size=batch):
+        yield MerchantListItem.from_row(merchant)
 
-    # Format response
+
+def _format_merchant_details(merchant: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Shape a merchant details row (with its child lists) for the API response
+    """
     result = {
         "id": merchant["id"],
         "business_name": merchant["business_name"],
@@ -164,16 +195,41 @@ def get_merchant_details(merchant_id: str) -> Optional[Dict[str, Any]]:
             "email": merchant["email"],
             "full_name": merchant["full_name"]
         },
-        "bank_details": bank_details,
-        "upi_details": upi_details,
+        "bank_details": merchant["bank_details"],
+        "upi_details": merchant["upi_details"],
         "commission_rate": merchant["commission_rate"] if "commission_rate" in merchant else 0,
-        "ip_whitelist": ip_whitelist
-        # "rate_limits": rate_limits
+        "ip_whitelist": merchant["ip_whitelist"]
     }
 
     return result
 
 
+@cached(cache=merchant_cache, key=merchant_cache_key, lock=cache_lock)
+def _get_cached_merchant_details(merchant_id: str) -> Optional[Dict[str, Any]]:
+    # Shared cache entry; never hand this dict to callers directly
+    merchant = execute_prepared(MERCHANT_DETAILS, (merchant_id,), single=True)
+
+    if not merchant:
+        return None
+
+    return _format_merchant_details(merchant)
+
+
+def get_merchant_details(merchant_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get merchant details (cached for a few seconds, see app.core.cache)
+
+    Parameters:
+    - merchant_id: Merchant ID
+
+    Returns:
+    - Merchant details, a copy the caller is free to modify
+    """
+    merchant = _get_cached_merchant_details(merchant_id)
+
+    return copy.deepcopy(merchant) if merchant else None
+
+
 def create_merchant(merchant_data: Dict[str, Any]) -> Dict[str, Any]:
     """
     Create a new merchant
@@ -184,9 +240,6 @@ def create_merchant(merchant_data: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
     - Created merchant
     """
-    # Start a transaction
-    queries = []
-
     # Create user
     email = merchant_data.get("email")
     password = merchant_data.get("password")
@@ -195,17 +248,16 @@ def create_merchant(merchant_data: Dict[str, Any]) -> Dict[str, Any]:
     if not email or not password:
         raise ValueError("Email and password are required")
 
-    # Check if email already exists
-    check_email_query = """
-    SELECT id FROM users WHERE email = %s
+    # Reject known duplicates before paying for the bcrypt hash
+    email_taken_query = """
+    SELECT 1 FROM users WHERE email = %s
     """
 
-    email_exists = execute_query(check_email_query, (email,), single=True)
-
-    if email_exists:
+    if execute_query(email_taken_query, (email,), single=True):
         raise ValueError("Email already exists")
 
-    # Create user query
+    # Create user query; a duplicate email that slipped past the check above
+    # (concurrent signup) inserts nothing and returns no row
     hashed_password = get_password_hash(password)
 
     create_user_query = """
@@ -213,14 +265,13 @@ def create_merchant(merchant_data: Dict[str, Any]) -> Dict[str, Any]:
         email, hashed_password, full_name, is_active, is_superuser
     ) VALUES (
         %s, %s, %s, TRUE, FALSE
-    ) RETURNING id
+    )
+    ON CONFLICT (email) DO NOTHING
+    RETURNING id
     """
 
     create_user_params = (email, hashed_password, full_name)
 
-    # Add to transaction
-    queries.append((create_user_query, create_user_params))
-
     # Generate API key
     api_key = generate_api_key()
 
@@ -232,7 +283,10 @@ def create_merchant(merchant_data: Dict[str, Any]) -> Dict[str, Any]:
         min_withdrawal, max_withdrawal
     ) VALUES (
         %s, %s, %s, %s, %s, %s, %s, TRUE, %s, %s, %s, %s
-    ) RETURNING id
+    ) RETURNING
+        id, business_name, business_type, contact_phone, address, api_key,
+        is_active, callback_url, commission_rate, min_deposit, max_deposit,
+        min_withdrawal, max_withdrawal, created_at, updated_at
     """
 
     create_merchant_params = (
@@ -250,59 +304,19 @@ def create_merchant(merchant_data: Dict[str, Any]) -> Dict[str, Any]:
     )
 
     # Add bank details if provided
-    bank_details = merchant_data.get("bank_details", [])
-    if isinstance(bank_details, dict):
-        bank_details = [bank_details]
-
-    bank_queries = []
-    for bank in bank_details:
-        bank_query = """
-        INSERT INTO merchant_bank_details (
-            merchant_id, bank_name, account_name, account_number, ifsc_code, is_active
-        ) VALUES (
-            %s, %s, %s, %s, %s, %s
-        )
-        """
-
-        bank_params = (
-            "placeholder_merchant_id",  # Will be replaced with actual merchant ID
-            bank.get("bank_name"),
-            bank.get("account_name"),
-            bank.get("account_number"),
-            bank.get("ifsc_code"),
-            bank.get("is_active", True)
-        )
-
-        bank_queries.append((bank_query, bank_params))
+    bank_details = _as_list(merchant_data.get("bank_details"))
 
     # Add UPI details if provided
-    upi_details = merchant_data.get("upi_details", [])
-    if isinstance(upi_details, dict):
-        upi_details = [upi_details]
-
-    upi_queries = []
-    for upi in upi_details:
-        upi_query = """
-        INSERT INTO merchant_upi_details (
-            merchant_id, upi_id, name, is_active
-        ) VALUES (
-            %s, %s, %s, %s
-        )
-        """
-
-        upi_params = (
-            "placeholder_merchant_id",  # Will be replaced with actual merchant ID
-            upi.get("upi_id"),
-            upi.get("name"),
-            upi.get("is_active", True)
-        )
-
-        upi_queries.append((upi_query, upi_params))
+    upi_details = _as_list(merchant_data.get("upi_details"))
 
     # Execute transaction
     try:
         # Create user
         user_result = execute_query(create_user_query, create_user_params, single=True)
+
+        if user_result is None:
+            raise ValueError("Email already exists")
+
         user_id = user_result["id"]
 
         # Update merchant params with user ID
@@ -313,17 +327,49 @@ def create_merchant(merchant_data: Dict[str, Any]) -> Dict[str, Any]:
         merchant_id = merchant_result["id"]
 
         # Add bank details
-        for i, (bank_query, bank_params) in enumerate(bank_queries):
-            bank_params = (merchant_id,) + bank_params[1:]
-            execute_query(bank_query, bank_params, fetch=False)
+        created_bank_details = [
+            execute_prepared(
+                INSERT_BANK_DETAILS,
+                (
+                    merchant_id,
+                    bank.get("bank_name"),
+                    bank.get("account_name"),
+                    bank.get("account_number"),
+                    bank.get("ifsc_code"),
+                    bank.get("is_active", True)
+                ),
+                single=True
+            )
+            for bank in bank_details
+        ]
 
         # Add UPI details
-        for i, (upi_query, upi_params) in enumerate(upi_queries):
-            upi_params = (merchant_id,) + upi_params[1:]
-            execute_query(upi_query, upi_params, fetch=False)
+        created_upi_details = [
+            execute_prepared(
+                INSERT_UPI_DETAILS,
+                (
+                    merchant_id,
+                    upi.get("upi_id"),
+                    upi.get("name"),
+                    upi.get("is_active", True)
+                ),
+                single=True
+            )
+            for upi in upi_details
+        ]
+
+        # Build the created merchant from the RETURNING rows instead of re-reading it
+        merchant = dict(
+            merchant_result,
+            user_id=user_id,
+            email=email,
+            full_name=full_name,
+            bank_details=created_bank_details,
+            upi_details=created_upi_details,
+            ip_whitelist=[]
+        )
 
-        # Get created merchant
-        return get_merchant_details(merchant_id)
+        return _format_merchant_details(merchant)
 
     except Exception as e:
         logger.error(f"Error creating merchant: {e}")
@@ -402,7 +448,7 @@ def update_merchant(merchant_id: str, merchant_data: Dict[str, Any]) -> Dict[str
     execute_query(update_query, tuple(params), fetch=False)
 
     # Update bank details if provided
-    bank_details = merchant_data.get("bank_details")
+    bank_details = _as_list(merchant_data.get("bank_details"))
     if bank_details:
         # First, deactivate all existing bank details
         deactivate_query = """
@@ -413,59 +459,43 @@ def update_merchant(merchant_id: str, merchant_data: Dict[str, Any]) -> Dict[str
 
         execute_query(deactivate_query, (merchant_id,), fetch=False)
 
-        # Then, upsert new bank details
-        if isinstance(bank_details, dict):
-            bank_details = [bank_details]
-
-        for bank in bank_details:
-            if "id" in bank:
-                # Update existing bank detail
-                update_bank_query = """
-                UPDATE merchant_bank_details
-                SET 
-                    bank_name = %s,
-                    account_name = %s,
-                    account_number = %s,
-                    ifsc_code = %s,
-                    is_active = %s
-                WHERE 
-                    id = %s AND merchant_id = %s
-                """
-
-                update_bank_params = (
-                    bank.get("bank_name"),
-                    bank.get("account_name"),
-                    bank.get("account_number"),
-                    bank.get("ifsc_code"),
-                    bank.get("is_active", True),
-                    bank["id"],
-                    merchant_id
-                )
-
-                execute_query(update_bank_query, update_bank_params, fetch=False)
-            else:
-                # Insert new bank detail
-                insert_bank_query = """
-                INSERT INTO merchant_bank_details (
-                    merchant_id, bank_name, account_name, account_number, ifsc_code, is_active
-                ) VALUES (
-                    %s, %s, %s, %s, %s, %s
-                )
-                """
-
-                insert_bank_params = (
-                    merchant_id,
-                    bank.get("bank_name"),
-                    bank.get("account_name"),
-                    bank.get("account_number"),
-                    bank.get("ifsc_code"),
-                    bank.get("is_active", True)
-                )
+        # Then, upsert new bank details in a single statement
+        upsert_bank_query = """
+        INSERT INTO merchant_bank_details (
+            id, merchant_id, bank_name, account_name, account_number, ifsc_code, is_active
+        ) VALUES %s
+        ON CONFLICT (id) DO UPDATE SET
+            bank_name = EXCLUDED.bank_name,
+            account_name = EXCLUDED.account_name,
+            account_number = EXCLUDED.account_number,
+            ifsc_code = EXCLUDED.ifsc_code,
+            is_active = EXCLUDED.is_active
+        WHERE
+            merchant_bank_details.merchant_id = EXCLUDED.merchant_id
+        """
 
-                execute_query(insert_bank_query, insert_bank_params, fetch=False)
+        # Rows without an ID get a freshly generated one
+        bank_params = [
+            (
+                bank.get("id"),
+                merchant_id,
+                bank.get("bank_name"),
+                bank.get("account_name"),
+                bank.get("account_number"),
+                bank.get("ifsc_code"),
+                bank.get("is_active", True)
+            )
+            for bank in bank_details
+        ]
+
+        execute_values_query(
+            upsert_bank_query,
+            bank_params,
+            template="(COALESCE(%s::uuid, uuid_generate_v4()), %s, %s, %s, %s, %s, %s)"
+        )
 
     # Update UPI details if provided
-    upi_details = merchant_data.get("upi_details")
+    upi_details = _as_list(merchant_data.get("upi_details"))
     if upi_details:
         # First, deactivate all existing UPI details
         deactivate_query = """
@@ -476,50 +506,39 @@ def update_merchant(merchant_id: str, merchant_data: Dict[str, Any]) -> Dict[str
 
         execute_query(deactivate_query, (merchant_id,), fetch=False)
 
-        # Then, upsert new UPI details
-        if isinstance(upi_details, dict):
-            upi_details = [upi_details]
-
-        for upi in upi_details:
-            if "id" in upi:
-                # Update existing UPI detail
-                update_upi_query = """
-                UPDATE merchant_upi_details
-                SET 
-                    upi_id = %s,
-                    name = %s,
-                    is_active = %s
-                WHERE 
-                    id = %s AND merchant_id = %s
-                """
-
-                update_upi_params = (
-                    upi.get("upi_id"),
-                    upi.get("name"),
-                    upi.get("is_active", True),
-                    upi["id"],
-                    merchant_id
-                )
-
-                execute_query(update_upi_query, update_upi_params, fetch=False)
-            else:
-                # Insert new UPI detail
-                insert_upi_query = """
-                INSERT INTO merchant_upi_details (
-                    merchant_id, upi_id, name, is_active
-                ) VALUES (
-                    %s, %s, %s, %s
-                )
-                """
-
-                insert_upi_params = (
-                    merchant_id,
-                    upi.get("upi_id"),
-                    upi.get("name"),
-                    upi.get("is_active", True)
-                )
+        # Then, upsert new UPI details in a single statement
+        upsert_upi_query = """
+        INSERT INTO merchant_upi_details (
+            id, merchant_id, upi_id, name, is_active
+        ) VALUES %s
+        ON CONFLICT (id) DO UPDATE SET
+            upi_id = EXCLUDED.upi_id,
+            name = EXCLUDED.name,
+            is_active = EXCLUDED.is_active
+        WHERE
+            merchant_upi_details.merchant_id = EXCLUDED.merchant_id
+        """
 
-                execute_query(insert_upi_query, insert_upi_params, fetch=False)
+        # Rows without an ID get a freshly generated one
+        upi_params = [
+            (
+                upi.get("id"),
+                merchant_id,
+                upi.get("upi_id"),
+                upi.get("name"),
+                upi.get("is_active", True)
+            )
+            for upi in upi_details
+        ]
+
+        execute_values_query(
+            upsert_upi_query,
+            upi_params,
+            template="(COALESCE(%s::uuid, uuid_generate_v4()), %s, %s, %s, %s)"
+        )
+
+    # Drop stale cached copies before re-reading
+    invalidate_merchant_cache(merchant_id)
 
     # Return updated merchant
     return get_merchant_details(merchant_id)
@@ -535,18 +554,24 @@ def regenerate_api_key(merchant_id: str) -> str:
     Returns:
     - New API key
     """
-    # Generate new API key
+    # Same key format as create_merchant
     api_key = generate_api_key()
 
-    # Update merchant
     update_query = """
     UPDATE merchants
     SET 
         api_key = %s
     WHERE 
         id = %s
+    RETURNING api_key
     """
 
-    execute_query(update_query, (api_key, merchant_id), fetch=False)
+    result = execute_query(update_query, (api_key, merchant_id), single=True)
+
+    if not result:
+        raise ValueError("Merchant not found")
+
+    # Drop the old API key from the shared lookup so no worker keeps resolving it
+    invalidate_merchant_cache(merchant_id)
 
-    return api_key
\ No newline at end of file
+    return result["api_key"]
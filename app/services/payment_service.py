@@ -1,27 +1,256 @@
-import uuid
-import hashlib
-import json
+import orjson
+import psycopg2
+import string
 import logging
-import requests
 from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, Tuple, List
 import asyncio
 import urllib.parse
+from functools import partial
+from cachetools import cached
 from app.utils.validators import validate_utr_number
 from app.core.config import settings
-from app.db.connection import execute_query, execute_transaction
-from app.services.webhook_service import send_webhook
+from app.core.cache import payment_merchant_cache, merchant_cache_key, cache_lock
+from app.db.connection import (
+    execute_query,
+    execute_transaction,
+    prepare_statement,
+    execute_prepared
+)
+from app.services.webhook_service import enqueue_webhook
 
 logger = logging.getLogger(__name__)
 
+# Characters that can go into a UPI link / query value without percent-encoding
+_UPI_SAFE = frozenset(string.ascii_letters + string.digits + "@._-")
 
-def create_transaction_hash() -> str:
-    """Generate a unique transaction hash key."""
-    # Create a random UUID and hash it
-    random_uuid = str(uuid.uuid4())
-    hash_obj = hashlib.sha256(random_uuid.encode())
-    # Return first 24 characters of the hash
-    return hash_obj.hexdigest()[:24]
+_UPI_LINK = "upi://pay?pa={pa}&pn={pn}&am={am}&cu=INR&tn={tn}".format
+
+# Frontend pages the payer is sent to, and their query string encoder
+_PAYMENT_PAGE_URL = f"{settings.FRONTEND_URL}/payment-page"
+_BANK_TRANSFER_PAGE_URL = f"{settings.FRONTEND_URL}/bank-transfer-page"
+_urlencode = partial(urllib.parse.urlencode, safe="/", quote_via=urllib.parse.quote)
+
+# Merchant limit columns and error label per payment type
+_LIMIT_KEYS = {
+    "DEPOSIT": ("min_deposit", "max_deposit", "Deposit"),
+    "WITHDRAWAL": ("min_withdrawal", "max_withdrawal", "Withdrawal"),
+}
+
+# Hot statements, parsed and planned once per pooled connection
+
+MERCHANT_PAYMENT_SETTINGS = prepare_statement("merchant_payment_settings", """
+    SELECT 
+        min_deposit, max_deposit, min_withdrawal, max_withdrawal,
+        callback_url, webhook_secret
+    FROM 
+        merchants
+    WHERE 
+        id = %s
+""")
+
+# Payment insert shared by every payment type
+_INSERT_PAYMENT = """
+    INSERT INTO payments (
+        merchant_id, reference, trxn_hash_key, payment_type, payment_method,
+        amount, currency, account_name, account_number, bank, bank_ifsc,
+        user_data
+    ) SELECT 
+        %(merchant_id)s, %(reference)s, encode(gen_random_bytes(12), 'hex'), %(payment_type)s, %(payment_method)s,
+        %(amount)s, %(currency)s, %(account_name)s, %(account_number)s, %(bank)s, %(bank_ifsc)s,
+        %(user_data)s
+"""
+
+# The transaction hash key (96 random bits as 24 hex characters) is generated
+# by the insert
+_RETURNING_PAYMENT = """
+    RETURNING id, trxn_hash_key, created_at
+"""
+
+# Deposits insert FROM the merchant's active receiving account and return it
+_INSERT_DEPOSIT = """
+    WITH receiver AS ({receiver_query}),
+    inserted AS (
+        {insert_query}
+        FROM receiver
+        {returning}
+    )
+    SELECT 
+        inserted.*, receiver.*
+    FROM 
+        inserted, receiver
+"""
+
+INSERT_UPI_DEPOSIT = prepare_statement("insert_upi_deposit", _INSERT_DEPOSIT.format(
+    receiver_query="""
+        SELECT 
+            upi_id, name
+        FROM 
+            merchant_upi_details
+        WHERE 
+            merchant_id = %(merchant_id)s AND is_active = TRUE
+        LIMIT 1
+    """,
+    insert_query=_INSERT_PAYMENT,
+    returning=_RETURNING_PAYMENT
+))
+
+INSERT_BANK_DEPOSIT = prepare_statement("insert_bank_deposit", _INSERT_DEPOSIT.format(
+    receiver_query="""
+        SELECT 
+            bank_name, account_name, account_number, ifsc_code
+        FROM 
+            merchant_bank_details
+        WHERE 
+            merchant_id = %(merchant_id)s AND is_active = TRUE
+        LIMIT 1
+    """,
+    insert_query=_INSERT_PAYMENT,
+    returning=_RETURNING_PAYMENT
+))
+
+INSERT_WITHDRAWAL = prepare_statement("insert_withdrawal", _INSERT_PAYMENT + _RETURNING_PAYMENT)
+
+PAYMENT_BY_HASH_KEY = prepare_statement("payment_by_hash_key", """
+    SELECT 
+        id as transaction_id, reference, payment_type as type,
+        status, remarks, created_at as requested_date
+    FROM 
+        payments
+    WHERE 
+        trxn_hash_key = %s
+""")
+
+# Confirms a pending payment, computes and records its fee and fetches the
+# merchant's webhook settings in one statement. The single row always comes
+# back: id is NULL when nothing was confirmed, and duplicate_reference names
+# the payment that already holds the UTR.
+CONFIRM_PAYMENT = prepare_statement("confirm_payment", """
+    WITH duplicate AS (
+        SELECT reference
+        FROM payments
+        WHERE utr_number = %(utr_number)s AND status = 'CONFIRMED'
+        LIMIT 1
+    ),
+    pending AS (
+        SELECT 
+            p.id, m.commission_rate,
+            trunc(p.amount * m.commission_rate / 100)::int AS fee_amount
+        FROM 
+            payments p
+        JOIN
+            merchants m ON p.merchant_id = m.id
+        WHERE 
+            p.id = %(payment_id)s AND p.status = 'PENDING'
+            AND NOT EXISTS (SELECT 1 FROM duplicate)
+    ),
+    updated AS (
+        UPDATE payments
+        SET 
+            status = 'CONFIRMED',
+            utr_number = %(utr_number)s,
+            verified_by = %(verified_by)s,
+            verification_method = %(verification_method)s,
+            remarks = %(remarks)s,
+            updated_at = NOW()
+        FROM 
+            pending
+        WHERE 
+            payments.id = pending.id AND payments.status = 'PENDING'
+        RETURNING 
+            payments.id, payments.merchant_id, payments.reference, payments.amount,
+            payments.currency, payments.payment_type, payments.status,
+            pending.commission_rate, pending.fee_amount
+    ),
+    fee AS (
+        INSERT INTO transaction_fees (
+            payment_id, merchant_id, original_amount, commission_rate, 
+            fee_amount, final_amount
+        )
+        SELECT 
+            id, merchant_id, amount, commission_rate, fee_amount, amount - fee_amount
+        FROM 
+            updated
+    )
+    SELECT 
+        (SELECT reference FROM duplicate) AS duplicate_reference,
+        u.*, m.callback_url, m.webhook_secret, m.batched_webhooks
+    FROM 
+        (SELECT 1) AS one
+    LEFT JOIN 
+        (updated u JOIN merchants m ON u.merchant_id = m.id) ON TRUE
+""")
+
+DECLINE_PAYMENT = prepare_statement("decline_payment", """
+    WITH updated AS (
+        UPDATE payments
+        SET 
+            status = 'DECLINED',
+            verified_by = %s,
+            remarks = %s,
+            updated_at = NOW()
+        WHERE 
+            id = %s AND status = 'PENDING'
+        RETURNING id, merchant_id, reference, amount, currency, payment_type, status
+    )
+    SELECT 
+        u.*, m.callback_url, m.webhook_secret, m.batched_webhooks
+    FROM 
+        updated u
+    JOIN 
+        merchants m ON u.merchant_id = m.id
+""")
+
+STORE_PAYMENT_UTR = prepare_statement("store_payment_utr", """
+    UPDATE payments
+    SET 
+        utr_number = %s,
+        updated_at = NOW()
+    WHERE 
+        id = %s AND status = 'PENDING'
+    RETURNING id, merchant_id, reference, amount, currency, payment_type, status
+""")
+
+INSERT_PAYMENT_LINK = prepare_statement("insert_payment_link", """
+    INSERT INTO payment_links (
+        merchant_id, reference, amount, description, status, expires_at
+    ) VALUES (
+        %s, %s, %s, %s, 'ACTIVE', %s
+    ) RETURNING id, reference, amount, status, expires_at
+""")
+
+
+def _quote_upi(value: str) -> str:
+    """
+    Percent-encode a UPI id or payee name, skipping the common all-safe case
+
+    Parameters:
+    - value: UPI id or payee name
+
+    Returns:
+    - Value safe to embed in a URL query string
+    """
+    if _UPI_SAFE.issuperset(value):
+        return value
+    return urllib.parse.quote(value, safe='')
+
+
+@cached(cache=payment_merchant_cache, key=merchant_cache_key, lock=cache_lock)
+def _get_merchant(merchant_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Get the merchant settings used on the payment path (cached, see app.core.cache)
+
+    Limit edits and deactivation take effect on every worker as soon as
+    invalidate_merchant_cache runs; while Redis is unreachable they can lag
+    by up to MERCHANT_CACHE_TTL (5) seconds.
+
+    Parameters:
+    - merchant_id: ID of the merchant
+
+    Returns:
+    - Merchant payment limits, callback URL and webhook secret
+    """
+    return execute_prepared(MERCHANT_PAYMENT_SETTINGS, (merchant_id,), single=True)
 
 
 def create_payment_request(
@@ -45,39 +274,24 @@ def create_payment_request(
     # Get the return URL from payment data (we won't store this)
     return_url = payment_data.get("return_url", "")
 
+    # Reject unknown payment types before touching the merchant
+    try:
+        min_key, max_key, label = _LIMIT_KEYS[payment_type]
+    except KeyError:
+        raise ValueError("Invalid payment type. Must be DEPOSIT or WITHDRAWAL")
+
     # Get merchant's payment limits
-    query = """
-    SELECT 
-        min_deposit, max_deposit, min_withdrawal, max_withdrawal
-    FROM 
-        merchants
-    WHERE 
-        id = %s
-    """
-    limits = execute_query(query, (merchant_id,), single=True)
+    limits = _get_merchant(merchant_id)
 
     # Validate amount limits
-    if payment_type == "DEPOSIT":
-        if amount < limits["min_deposit"] or amount > limits["max_deposit"]:
-            raise ValueError(
-                f"Deposit amount must be between {limits['min_deposit']} and {limits['max_deposit']}"
-            )
-    elif payment_type == "WITHDRAWAL":
-        if amount < limits["min_withdrawal"] or amount > limits["max_withdrawal"]:
-            raise ValueError(
-                f"Withdrawal amount must be between {limits['min_withdrawal']} and {limits['max_withdrawal']}"
-            )
-    else:
-        raise ValueError("Invalid payment type. Must be DEPOSIT or WITHDRAWAL")
-
-    # Generate transaction hash key
-    trxn_hash_key = create_transaction_hash()
+    min_amount, max_amount = limits[min_key], limits[max_key]
+    if not min_amount <= amount <= max_amount:
+        raise ValueError(f"{label} amount must be between {min_amount} and {max_amount}")
 
     # Prepare data for database insertion
     insert_data = {
         "merchant_id": merchant_id,
         "reference": payment_data.get("reference"),
-        "trxn_hash_key": trxn_hash_key,
         "payment_type": payment_type,
         "payment_method": "UPI" if payment_data.get("ae_type") == "1" else "BANK_TRANSFER",
         "amount": amount,
@@ -86,49 +300,40 @@ def create_payment_request(
         "account_number": payment_data.get("account_number"),
         "bank": payment_data.get("bank"),
         "bank_ifsc": payment_data.get("bank_ifsc"),
-        "user_data": json.dumps(payment_data.get("user_data", {}))
+        "user_data": orjson.dumps(payment_data.get("user_data") or {}).decode()
     }
 
-    # Create SQL query for inserting payment
-    query = """
-    INSERT INTO payments (
-        merchant_id, reference, trxn_hash_key, payment_type, payment_method,
-        amount, currency, account_name, account_number, bank, bank_ifsc,
-        user_data
-    ) VALUES (
-        %(merchant_id)s, %(reference)s, %(trxn_hash_key)s, %(payment_type)s, %(payment_method)s,
-        %(amount)s, %(currency)s, %(account_name)s, %(account_number)s, %(bank)s, %(bank_ifsc)s,
-        %(user_data)s
-    ) RETURNING id, created_at;
-    """
+    payment_method = insert_data["payment_method"]
+
+    # Deposits pick the merchant's active receiving account in the same
+    # statement; nothing is inserted if the merchant has none
+    if payment_type == "DEPOSIT":
+        statement = INSERT_UPI_DEPOSIT if payment_method == "UPI" else INSERT_BANK_DEPOSIT
+    else:
+        statement = INSERT_WITHDRAWAL
+
+    # Execute query and get the inserted ID, timestamp and receiving account
+    result = execute_prepared(statement, insert_data, single=True)
+
+    if not result:
+        if payment_method == "UPI":
+            raise ValueError("No active UPI payment method available")
+        raise ValueError("No active bank account available for transfer")
 
-    # Execute query and get the inserted ID and timestamp
-    result = execute_query(query, insert_data, single=True)
     payment_id = result["id"]
-    payment_method = "UPI" if payment_data.get("ae_type") == "1" else "BANK_TRANSFER"
+    trxn_hash_key = result["trxn_hash_key"]
 
     # Format response based on payment type
     if payment_type == "DEPOSIT":
         if payment_method == "UPI":
-            # Get active UPI details for the merchant
-            upi_query = """
-            SELECT 
-                upi_id, name
-            FROM 
-                merchant_upi_details
-            WHERE 
-                merchant_id = %s AND is_active = TRUE
-            LIMIT 1
-            """
-            upi_details = execute_query(upi_query, (merchant_id,), single=True)
-
-            if not upi_details:
-                raise ValueError("No active UPI payment method available")
+            upi_details = result
 
             # Generate UPI payment link (frontend can generate QR code from this)
-            upi_link = f"upi://pay?pa={urllib.parse.quote(upi_details['upi_id'])}&pn={urllib.parse.quote(upi_details['name'])}&am={amount}&cu=INR&tn={trxn_hash_key}"
+            upi_id = _quote_upi(upi_details["upi_id"])
+            payee_name = _quote_upi(upi_details["name"])
+            upi_link = _UPI_LINK(pa=upi_id, pn=payee_name, am=amount, tn=trxn_hash_key)
             # Generate payment page URL including payment_id and transaction details
-            payment_page_url = f"{settings.FRONTEND_URL}/payment-page?id={payment_id}&hash={trxn_hash_key}&amount={amount}&upi_id={urllib.parse.quote(upi_details['upi_id'])}&name={urllib.parse.quote(upi_details['name'])}"
+            payment_page_url = f"{_PAYMENT_PAGE_URL}?id={payment_id}&hash={trxn_hash_key}&amount={amount}&upi_id={upi_id}&name={payee_name}"
             # Add return URL as a parameter if provided
             if return_url:
                 # Optional: Validate return URL domain if needed
@@ -136,68 +341,45 @@ def create_payment_request(
                 #     return_url = ""
                 
                 # Encode the return URL and add it to the payment page URL
-                payment_page_url += f"&redirect={urllib.parse.quote(return_url)}"
-            response = {
-                "message": "Success",
-                "status": 201,
-                "response": {
-                    "paymentMethod": "UPI",
-                    "receiverInfo": {
-                        "upi_id": upi_details["upi_id"],
-                        "name": upi_details["name"]
-                    },
-                    "upiLink": upi_link,
-                    "paymentPageUrl": payment_page_url,
-                    "trxnHashKey": trxn_hash_key,
-                    "amount": str(amount),
-                    "requestedDate": result["created_at"].isoformat()
-                }
+                payment_page_url += "&" + _urlencode({"redirect": return_url})
+            response_data = {
+                "paymentMethod": "UPI",
+                "receiverInfo": {
+                    "upi_id": upi_details["upi_id"],
+                    "name": upi_details["name"]
+                },
+                "upiLink": upi_link,
+                "paymentPageUrl": payment_page_url
             }
         else:  # BANK_TRANSFER
-            # Get active bank details for the merchant
-            bank_query = """
-            SELECT 
-                bank_name, account_name, account_number, ifsc_code
-            FROM 
-                merchant_bank_details
-            WHERE 
-                merchant_id = %s AND is_active = TRUE
-            LIMIT 1
-            """
-            bank_details = execute_query(bank_query, (merchant_id,), single=True)
-
-            if not bank_details:
-                raise ValueError("No active bank account available for transfer")
-
-            # Generate payment page URL for bank transfer
-            payment_page_url = f"{settings.FRONTEND_URL}/bank-transfer-page?id={payment_id}&hash={trxn_hash_key}&amount={amount}"
-            
-            # Add bank details to the URL
-            payment_page_url += f"&bank_name={urllib.parse.quote(bank_details['bank_name'])}"
-            payment_page_url += f"&account_name={urllib.parse.quote(bank_details['account_name'])}"
-            payment_page_url += f"&account_number={urllib.parse.quote(bank_details['account_number'])}"
-            payment_page_url += f"&ifsc_code={urllib.parse.quote(bank_details['ifsc_code'])}"
-            
+            bank_details = result
+
+            # Generate payment page URL for bank transfer, including bank details
+            page_query = {
+                "id": payment_id,
+                "hash": trxn_hash_key,
+                "amount": amount,
+                "bank_name": bank_details["bank_name"],
+                "account_name": bank_details["account_name"],
+                "account_number": bank_details["account_number"],
+                "ifsc_code": bank_details["ifsc_code"]
+            }
+
             # Add return URL as a parameter if provided
             if return_url:
-                payment_page_url += f"&redirect={urllib.parse.quote(return_url)}"
-                
-            response = {
-                "message": "Success",
-                "status": 201,
-                "response": {
-                    "paymentMethod": "BANK_TRANSFER",
-                    "receiverBankInfo": {
-                        "bank_name": bank_details["bank_name"],
-                        "account_name": bank_details["account_name"],
-                        "account_number": bank_details["account_number"],
-                        "ifsc_code": bank_details["ifsc_code"]
-                    },
-                    "paymentPageUrl": payment_page_url,
-                    "trxnHashKey": trxn_hash_key,
-                    "amount": str(amount),
-                    "requestedDate": result["created_at"].isoformat()
-                }
+                page_query["redirect"] = return_url
+
+            payment_page_url = f"{_BANK_TRANSFER_PAGE_URL}?{_urlencode(page_query)}"
+
+            response_data = {
+                "paymentMethod": "BANK_TRANSFER",
+                "receiverBankInfo": {
+                    "bank_name": bank_details["bank_name"],
+                    "account_name": bank_details["account_name"],
+                    "account_number": bank_details["account_number"],
+                    "ifsc_code": bank_details["ifsc_code"]
+                },
+                "paymentPageUrl": payment_page_url
             }
     else:  # WITHDRAWAL
          # For withdrawals, we can still generate a status page URL
@@ -206,24 +388,25 @@ def create_payment_request(
         # Add return URL as a parameter if provided
         # if return_url:
             # status_page_url += f"&redirect={urllib.parse.quote(return_url)}"
-        response = {
-            "message": "Success",
-            "status": 201,
-            "response": {
-                "receiverBankInfo": {
-                    "bank": insert_data["bank"],
-                    "bank_ifsc": insert_data["bank_ifsc"],
-                    "account_name": insert_data["account_name"],
-                    "account_number": insert_data["account_number"],
-                },
-                "trxnHashKey": trxn_hash_key,
-                "amount": str(amount),
-                "requestedDate": result["created_at"].isoformat(),
-                # "statusPageUrl": status_page_url  # New field with the status page URL
-            }
+        response_data = {
+            "receiverBankInfo": {
+                "bank": insert_data["bank"],
+                "bank_ifsc": insert_data["bank_ifsc"],
+                "account_name": insert_data["account_name"],
+                "account_number": insert_data["account_number"],
+            },
+            # "statusPageUrl": status_page_url  # New field with the status page URL
         }
 
-    return response
+    response_data["trxnHashKey"] = trxn_hash_key
+    response_data["amount"] = str(amount)
+    response_data["requestedDate"] = result["created_at"].isoformat()
+
+    return {
+        "message": "Success",
+        "status": 201,
+        "response": response_data
+    }
 
 
 def check_payment_request(trxn_hash_key: str) -> Dict[str, Any]:
@@ -236,27 +419,16 @@ def check_payment_request(trxn_hash_key: str) -> Dict[str, Any]:
     Returns:
     - Payment request status data
     """
-    query = """
-    SELECT 
-        id as transaction_id, reference, payment_type as type,
-        status, remarks, created_at as requested_date
-    FROM 
-        payments
-    WHERE 
-        trxn_hash_key = %s
-    """
-
-    payment = execute_query(query, (trxn_hash_key,), single=True)
+    payment = execute_prepared(PAYMENT_BY_HASH_KEY, (trxn_hash_key,), single=True)
 
     if not payment:
         raise ValueError("Transaction hash key invalid")
 
-    # Format the response
-    response = {
+    return {
         "message": "Success",
         "status": 200,
         "response": {
-            "transactionId": payment["transaction_id"],
+            "transactionId": str(payment["transaction_id"]),
             "reference": payment["reference"],
             "type": payment["type"],
             "status": payment["status"],
@@ -265,8 +437,6 @@ def check_payment_request(trxn_hash_key: str) -> Dict[str, Any]:
         }
     }
 
-    return response
-
 
 def verify_payment(
         payment_id: str,
@@ -292,89 +462,47 @@ def verify_payment(
     if not validate_utr_number(utr_number):
         raise ValueError("Invalid UTR number format")
 
-    # Check if UTR number is already used
-    check_query = """
-    SELECT id, merchant_id, reference
-    FROM payments
-    WHERE utr_number = %s AND status = 'CONFIRMED'
-    """
-    existing_payment = execute_query(check_query, (utr_number,), single=True)
-
-    if existing_payment:
-        raise ValueError(f"UTR number already used for payment {existing_payment['reference']}")
+    try:
+        # Check the UTR, confirm the payment, record the fee and fetch the
+        # merchant's webhook settings in one atomic statement; callback status
+        # is recorded by the webhook worker
+        updated_payment = execute_prepared(
+            CONFIRM_PAYMENT,
+            {
+                "utr_number": utr_number,
+                "payment_id": payment_id,
+                "verified_by": verified_by,
+                "verification_method": verification_method,
+                "remarks": remarks
+            },
+            single=True
+        )
+    except psycopg2.errors.UniqueViolation:
+        # Another payment was confirmed with this UTR concurrently
+        raise ValueError("UTR number already used for another payment")
 
-    # Get payment details including commission rate
-    payment_query = """
-    SELECT 
-        p.id, p.merchant_id, p.reference, p.amount, p.currency, 
-        p.payment_type, m.commission_rate
-    FROM 
-        payments p
-    JOIN
-        merchants m ON p.merchant_id = m.id
-    WHERE 
-        p.id = %s AND p.status = 'PENDING'
-    """
-    payment = execute_query(payment_query, (payment_id,), single=True)
+    if updated_payment["duplicate_reference"] is not None:
+        raise ValueError(f"UTR number already used for payment {updated_payment['duplicate_reference']}")
 
-    if not payment:
+    if updated_payment["id"] is None:
         raise ValueError("Payment not found or already processed")
 
-    # Calculate commission
-    commission_rate = payment["commission_rate"]
-    original_amount = payment["amount"]
-    fee_amount = int(original_amount * (commission_rate / 100))
-    final_amount = original_amount - fee_amount
-
-    # Update payment status
-    update_payment_query = """
-    UPDATE payments
-    SET 
-        status = 'CONFIRMED',
-        utr_number = %s,
-        verified_by = %s,
-        verification_method = %s,
-        remarks = %s,
-        updated_at = NOW()
-    WHERE 
-        id = %s AND status = 'PENDING'
-    RETURNING id, merchant_id, reference, amount, currency, payment_type, status
-    """
-    updated_payment = execute_query(update_payment_query, (utr_number, verified_by, verification_method, remarks, payment_id), single=True)
-
-    if not updated_payment:
-        raise ValueError("Payment update failed")
-
-    # Record transaction fee
-    insert_fee_query = """
-    INSERT INTO transaction_fees (
-        payment_id, merchant_id, original_amount, commission_rate, 
-        fee_amount, final_amount
-    ) VALUES (
-        %s, %s, %s, %s, %s, %s
-    )
-    """
-    execute_query(insert_fee_query, (payment_id, payment["merchant_id"], original_amount, commission_rate, fee_amount, final_amount), fetch=False)
-
-    # Include fee information in the return data
-    result = dict(updated_payment)
+    # Include fee information in the return data; the row is a dict already,
+    # so internal columns are popped off it instead of copying
+    result = updated_payment
+    del result["duplicate_reference"]
+    callback_url = result.pop("callback_url")
+    webhook_secret = result.pop("webhook_secret")
+    batch_key = str(result["merchant_id"]) if result.pop("batched_webhooks") else None
+    commission_rate = result.pop("commission_rate")
+    fee_amount = result.pop("fee_amount")
+    final_amount = result["amount"] - fee_amount
     result["fee_info"] = {
         "commission_rate": float(commission_rate),
         "fee_amount": fee_amount,
         "final_amount": final_amount
     }
 
-    # Get merchant callback URL
-    merchant_query = """
-    SELECT 
-        callback_url, webhook_secret
-    FROM 
-        merchants
-    WHERE 
-        id = %s
-    """
-    merchant = execute_query(merchant_query, (result["merchant_id"],), single=True)
-
     # Prepare callback data with fee information
     callback_data = {
         "reference_id": result["reference"],
@@ -388,135 +516,12 @@ def verify_payment(
         }
     }
 
-    # Send webhook asynchronously
-    asyncio.create_task(
-        send_webhook(
-            merchant["callback_url"],
-            callback_data,
-            merchant["webhook_secret"]
-        )
-    )
-
-    # Mark callback as sent
-    update_callback_query = """
-    UPDATE payments
-    SET 
-        callback_sent = TRUE,
-        callback_attempts = 1
-    WHERE 
-        id = %s
-    """
-    execute_query(update_callback_query, (payment_id,), fetch=False)
+    # Queue webhook for the background worker
+    enqueue_webhook(callback_url, callback_data, webhook_secret, str(result["id"]), batch_key)
 
     return result
 
 
-
-#
-# def verify_payment(
-#         payment_id: str,
-#         utr_number: str,
-#         verified_by: str,
-#         verification_method: str = "MANUAL",
-#         remarks: str = None
-# ) -> Dict[str, Any]:
-#     """
-#     Verify a payment (mark as CONFIRMED)
-#
-#     Parameters:
-#     - payment_id: Payment ID
-#     - utr_number: UTR number
-#     - verified_by: ID of the user who verified the payment
-#     - verification_method: How was the payment verified (MANUAL/AUTO)
-#     - remarks: Additional remarks
-#
-#     Returns:
-#     - Updated payment data
-#     """
-#     # Start a transaction
-#     queries = []
-#
-#     # Update payment query
-#     update_query = """
-#     UPDATE payments
-#     SET
-#         status = 'CONFIRMED',
-#         utr_number = %s,
-#         verified_by = %s,
-#         verification_method = %s,
-#         remarks = %s,
-#         updated_at = NOW()
-#     WHERE
-#         id = %s AND status = 'PENDING'
-#     RETURNING id, merchant_id, reference, amount, currency, payment_type, status
-#     """
-#
-#     # Add the update query to transaction
-#     queries.append((update_query, (utr_number, verified_by, verification_method, remarks, payment_id)))
-#
-#     try:
-#         # Execute the transaction
-#         result = execute_query(update_query, (utr_number, verified_by, verification_method, remarks, payment_id),
-#                                single=True)
-#
-#         if not result:
-#             raise ValueError("Payment not found or already processed")
-#
-#         # Get merchant callback URL
-#         merchant_query = """
-#         SELECT
-#             callback_url, webhook_secret
-#         FROM
-#             merchants
-#         WHERE
-#             id = %s
-#         """
-#         merchant = execute_query(merchant_query, (result["merchant_id"],), single=True)
-#
-#         # Prepare callback data
-#         callback_data = {
-#             "reference_id": result["reference"],
-#             "status": 2,  # 2: Confirmed
-#             "remarks": remarks or "Payment processed successfully",
-#             "amount": str(result["amount"])
-#         }
-#
-#         # Send webhook asynchronously
-#         asyncio.create_task(
-#             send_webhook(
-#                 merchant["callback_url"],
-#                 callback_data,
-#                 merchant["webhook_secret"]
-#             )
-#         )
-#
-#         # Mark callback as sent
-#         update_callback_query = """
-#         UPDATE payments
-#         SET
-#             callback_sent = TRUE,
-#             callback_attempts = 1
-#         WHERE
-#             id = %s
-#         """
-#         execute_query(update_callback_query, (payment_id,), fetch=False)
-#
-#         return {
-#             "id": result["id"],
-#             "reference": result["reference"],
-#             "status": result["status"],
-#             "amount": result["amount"],
-#             "currency": result["currency"],
-#             "payment_type": result["payment_type"],
-#             "utr_number": utr_number,
-#             "verified_by": verified_by
-#         }
-#
-#     except Exception as e:
-#         logger.error(f"Error verifying payment: {e}")
-#         raise
-
-
 def decline_payment(
         payment_id: str,
         declined_by: str,
@@ -533,34 +538,13 @@ def decline_payment(
     Returns:
     - Updated payment data
     """
-    update_query = """
-    UPDATE payments
-    SET 
-        status = 'DECLINED',
-        verified_by = %s,
-        remarks = %s,
-        updated_at = NOW()
-    WHERE 
-        id = %s AND status = 'PENDING'
-    RETURNING id, merchant_id, reference, amount, currency, payment_type, status
-    """
-
-    result = execute_query(update_query, (declined_by, remarks, payment_id), single=True)
+    # Decline the payment and fetch the merchant's webhook settings in one
+    # round-trip; callback status is recorded by the webhook worker
+    result = execute_prepared(DECLINE_PAYMENT, (declined_by, remarks, payment_id), single=True)
 
     if not result:
         raise ValueError("Payment not found or already processed")
 
-    # Get merchant callback URL
-    merchant_query = """
-    SELECT 
-        callback_url, webhook_secret
-    FROM 
-        merchants
-    WHERE 
-        id = %s
-    """
-    merchant = execute_query(merchant_query, (result["merchant_id"],), single=True)
-
     # Prepare callback data
     callback_data = {
         "reference_id": result["reference"],
@@ -569,26 +553,15 @@ def decline_payment(
         "amount": str(result["amount"])
     }
 
-    # Send webhook asynchronously
-    asyncio.create_task(
-        send_webhook(
-            merchant["callback_url"],
-            callback_data,
-            merchant["webhook_secret"]
-        )
+    # Queue webhook for the background worker
+    enqueue_webhook(
+        result["callback_url"],
+        callback_data,
+        result["webhook_secret"],
+        str(result["id"]),
+        str(result["merchant_id"]) if result["batched_webhooks"] else None
     )
 
-    # Mark callback as sent
-    update_callback_query = """
-    UPDATE payments
-    SET 
-        callback_sent = TRUE,
-        callback_attempts = 1
-    WHERE 
-        id = %s
-    """
-    execute_query(update_callback_query, (payment_id,), fetch=False)
-
     return {
         "id": result["id"],
         "reference": result["reference"],
@@ -603,51 +576,121 @@ def decline_payment(
 
 def get_pending_payments(
         merchant_id: Optional[str] = None,
-        days: int = 7
-) -> List[Dict[str, Any]]:
+        days: int = 7,
+        limit: int = 50,
+        cursor_created_at: Optional[datetime] = None,
+        cursor_id: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Get pending payments, newest first
+
+    Pages are keyset-paginated: pass next_cursor_created_at and next_cursor_id
+    of the previous page as the cursor to fetch the next one.
+
+    Parameters:
+    - merchant_id: Filter by merchant ID (optional)
+    - days: Number of days to look back
+    - limit: Maximum number of payments to return
+    - cursor_created_at: created_at of the last payment already returned
+    - cursor_id: id of the last payment already returned
+
+    Returns:
+    - Page of pending payments, whether another page follows and its cursor
+    """
+    return _get_pending_payments(merchant_id, days, limit, cursor_created_at, cursor_id, with_merchant=False)
+
+
+def get_pending_payments_with_merchant(
+        merchant_id: Optional[str] = None,
+        days: int = 7,
+        limit: int = 50,
+        cursor_created_at: Optional[datetime] = None,
+        cursor_id: Optional[str] = None
+) -> Dict[str, Any]:
     """
-    Get pending payments
+    Get pending payments along with the merchant's business name, newest first
 
     Parameters:
     - merchant_id: Filter by merchant ID (optional)
     - days: Number of days to look back
+    - limit: Maximum number of payments to return
+    - cursor_created_at: created_at of the last payment already returned
+    - cursor_id: id of the last payment already returned
 
     Returns:
-    - List of pending payments
+    - Page of pending payments, whether another page follows and its cursor
     """
+    return _get_pending_payments(merchant_id, days, limit, cursor_created_at, cursor_id, with_merchant=True)
+
+
+def _get_pending_payments(
+        merchant_id: Optional[str],
+        days: int,
+        limit: int,
+        cursor_created_at: Optional[datetime],
+        cursor_id: Optional[str],
+        with_merchant: bool
+) -> Dict[str, Any]:
     query_params = []
 
     # Base query
     query = """
     SELECT 
-        p.id, p.merchant_id, m.business_name, p.reference, p.trxn_hash_key,
-        p.payment_type, p.payment_method, p.amount, p.currency, p.utr,
+        p.id, p.merchant_id, p.reference, p.trxn_hash_key,
+        p.payment_type, p.payment_method, p.amount, p.currency, p.utr_number,
         p.account_name, p.account_number, p.bank, p.bank_ifsc,
         p.created_at, p.updated_at
+    """
+
+    if with_merchant:
+        query += """,
+        m.business_name
     FROM 
         payments p
     JOIN 
         merchants m ON p.merchant_id = m.id
+    """
+    else:
+        query += """
+    FROM 
+        payments p
+    """
+
+    query += """
     WHERE 
         p.status = 'PENDING'
-        AND p.created_at >= %s
+        AND p.created_at >= NOW() - make_interval(days => %s)
     """
 
     # Add days parameter
-    query_params.append(datetime.now() - timedelta(days=days))
+    query_params.append(days)
 
     # Add merchant filter if provided
     if merchant_id:
         query += " AND p.merchant_id = %s"
         query_params.append(merchant_id)
 
-    # Add order by
-    query += " ORDER BY p.created_at DESC"
+    # Continue after the previous page; id breaks created_at ties
+    if cursor_created_at is not None and cursor_id is not None:
+        query += " AND (p.created_at, p.id) < (%s, %s)"
+        query_params.extend([cursor_created_at, cursor_id])
+
+    # Add order by and page size; one extra row tells whether another page follows
+    query += " ORDER BY p.created_at DESC, p.id DESC LIMIT %s"
+    query_params.append(limit + 1)
 
     # Execute query
     payments = execute_query(query, tuple(query_params))
 
-    return payments
+    has_more = len(payments) > limit
+    payments = payments[:limit]
+
+    return {
+        "items": payments,
+        "has_more": has_more,
+        "next_cursor_created_at": payments[-1]["created_at"] if has_more else None,
+        "next_cursor_id": payments[-1]["id"] if has_more else None
+    }
 
 
 def create_payment_link(
@@ -674,16 +717,8 @@ def create_payment_link(
     expires_at = datetime.now() + timedelta(hours=expires_in_hours)
 
     # Create payment link in the database
-    query = """
-    INSERT INTO payment_links (
-        merchant_id, reference, amount, description, status, expires_at
-    ) VALUES (
-        %s, %s, %s, %s, 'ACTIVE', %s
-    ) RETURNING id, reference, amount, status, expires_at
-    """
-
-    result = execute_query(
-        query,
+    result = execute_prepared(
+        INSERT_PAYMENT_LINK,
         (merchant_id, reference, amount, description, expires_at),
         single=True
     )
@@ -719,24 +754,14 @@ def store_payment_utr(
     Returns:
     - Updated payment data
     """
-    try:
-        # Validate UTR number format
-        if not validate_utr_number(utr_number):
-            raise ValueError("Invalid UTR number format")
+    # Validate UTR number format before touching the database
+    if not validate_utr_number(utr_number):
+        raise ValueError("Invalid UTR number format")
 
+    try:
         # Store UTR but keep status as PENDING
-        update_query = """
-        UPDATE payments
-        SET 
-            utr_number = %s,
-            updated_at = NOW()
-        WHERE 
-            id = %s AND status = 'PENDING'
-        RETURNING id, merchant_id, reference, amount, currency, payment_type, status
-        """
-
-        payment = execute_query(
-            update_query,
+        payment = execute_prepared(
+            STORE_PAYMENT_UTR,
             (utr_number, payment_id),
             single=True
         )
@@ -1,208 +1,187 @@
+import asyncio
+import copy
 import logging
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from datetime import datetime, timedelta
 import csv
 import io
+from tempfile import SpooledTemporaryFile
 
-from app.db.connection import execute_query
+from cachetools import cached
+
+from app.core.cache import payment_stats_cache, cache_lock
+from app.db.connection import execute_query, copy_to, get_db_cursor
 
 logger = logging.getLogger(__name__)
 
+# Seconds between background refreshes of the report materialized views
+REPORT_VIEW_REFRESH_INTERVAL = 300
+# Advisory lock key that lets one worker at a time refresh the report views
+REPORT_VIEW_REFRESH_LOCK_ID = 720301
+_report_refresh_task: Optional[asyncio.Task] = None
 
-def get_payment_stats(days: int = 30) -> Dict[str, Any]:
-    """
-    Get payment statistics for dashboard
 
-    Parameters:
-    - days: Number of days to look back
-
-    Returns:
-    - Statistics dictionary
-    """
+@cached(cache=payment_stats_cache, key=lambda days=30: days, lock=cache_lock)
+def _get_cached_payment_stats(days: int = 30) -> Dict[str, Any]:
+    # Shared cache entry; never hand this dict to callers directly
     # Calculate start date
     start_date = datetime.now() - timedelta(days=days)
 
-    # Get total merchants
-    total_merchants_query = """
-    SELECT COUNT(*) as count FROM merchants
+    # Every statistic in one statement on one pooled connection: merchant
+    # counts, transaction totals, pending verification count, commission
+    # totals, and the three chart series as JSON arrays of response rows.
+    # Chart days the materialized view had fully seen at its last refresh
+    # (see refresh_report_views) come from the view, later days from the live
+    # table, so a missed refresh only costs speed, never data. The first,
+    # partial day is always counted live from start_date so the chart adds
+    # up to total_transactions.
+    stats_query = """
+    WITH refreshed AS (
+        SELECT 
+            COALESCE(MAX(refreshed_at)::date, %(start_date)s::date) AS live_from
+        FROM 
+            mv_daily_payment_stats
+    ),
+    daily AS (
+        SELECT 
+            to_char(date, 'YYYY-MM-DD') as date, count as total, confirmed
+        FROM 
+            mv_daily_payment_stats, refreshed
+        WHERE 
+            date > %(start_date)s::date AND date < refreshed.live_from
+        UNION ALL
+        SELECT 
+            to_char(DATE(created_at), 'YYYY-MM-DD') as date,
+            COUNT(*) as total,
+            COUNT(*) FILTER (WHERE status = 'CONFIRMED') as confirmed
+        FROM 
+            payments, refreshed
+        WHERE 
+            created_at >= %(start_date)s
+            AND (
+                created_at < %(start_date)s::date + 1
+                OR created_at >= refreshed.live_from
+            )
+        GROUP BY 
+            DATE(created_at)
+    ),
+    merchant_transactions AS (
+        SELECT 
+            m.business_name as merchant,
+            COALESCE(p.count, 0) as total,
+            COALESCE(p.confirmed, 0) as confirmed
+        FROM 
+            merchants m
+        LEFT JOIN (
+            SELECT 
+                merchant_id,
+                COUNT(*) as count,
+                COUNT(*) FILTER (WHERE status = 'CONFIRMED') as confirmed
+            FROM 
+                payments
+            WHERE 
+                created_at >= %(start_date)s
+            GROUP BY 
+                merchant_id
+        ) p ON p.merchant_id = m.id
+        ORDER BY 
+            total DESC
+        LIMIT 10
+    ),
+    merchant_commissions AS (
+        SELECT 
+            m.business_name as merchant,
+            f.total_amount, f.commission, f.final_amount, f.transaction_count
+        FROM 
+            (
+                SELECT 
+                    tf.merchant_id,
+                    SUM(tf.original_amount) as total_amount,
+                    SUM(tf.fee_amount) as commission,
+                    SUM(tf.final_amount) as final_amount,
+                    COUNT(*) as transaction_count
+                FROM 
+                    transaction_fees tf
+                JOIN
+                    payments p ON tf.payment_id = p.id
+                WHERE 
+                    p.created_at >= %(start_date)s AND p.status = 'CONFIRMED'
+                GROUP BY 
+                    tf.merchant_id
+            ) f
+        JOIN 
+            merchants m ON m.id = f.merchant_id
+        ORDER BY 
+            commission DESC
+        LIMIT 10
+    )
+    SELECT 
+        m.total_merchants, m.active_merchants,
+        p.total_transactions, p.successful_transactions,
+        p.total_deposit, p.total_withdrawal,
+        (SELECT COUNT(*) FROM payments WHERE status = 'PENDING') as pending_verification,
+        c.total_commission, c.avg_commission_rate,
+        (SELECT COALESCE(json_agg(d ORDER BY d.date), '[]') FROM daily d) as daily_chart_data,
+        (
+            SELECT COALESCE(json_agg(t ORDER BY t.total DESC), '[]') FROM merchant_transactions t
+        ) as merchant_chart_data,
+        (
+            SELECT COALESCE(json_agg(mc ORDER BY mc.commission DESC), '[]') FROM merchant_commissions mc
+        ) as merchant_commission_data
+    FROM 
+        (
+            SELECT 
+                COUNT(*) as total_merchants,
+                COUNT(*) FILTER (WHERE is_active = TRUE) as active_merchants
+            FROM merchants
+        ) m,
+        (
+            SELECT 
+                COUNT(*) as total_transactions,
+                COUNT(*) FILTER (WHERE status = 'CONFIRMED') as successful_transactions,
+                COALESCE(SUM(amount) FILTER (
+                    WHERE payment_type = 'DEPOSIT' AND status = 'CONFIRMED'
+                ), 0) as total_deposit,
+                COALESCE(SUM(amount) FILTER (
+                    WHERE payment_type = 'WITHDRAWAL' AND status = 'CONFIRMED'
+                ), 0) as total_withdrawal
+            FROM payments 
+            WHERE created_at >= %(start_date)s
+        ) p,
+        (
+            SELECT 
+                COALESCE(SUM(fee_amount), 0) as total_commission,
+                COALESCE(AVG(commission_rate), 0) as avg_commission_rate
+            FROM transaction_fees tf
+            JOIN payments p ON tf.payment_id = p.id
+            WHERE p.created_at >= %(start_date)s AND p.status = 'CONFIRMED'
+        ) c
     """
-    total_merchants = execute_query(total_merchants_query, single=True)["count"]
 
-    # Get active merchants
-    active_merchants_query = """
-    SELECT COUNT(*) as count FROM merchants WHERE is_active = TRUE
-    """
-    active_merchants = execute_query(active_merchants_query, single=True)["count"]
+    summary = execute_query(stats_query, {"start_date": start_date}, single=True)
 
-    # Get total transactions
-    total_transactions_query = """
-    SELECT COUNT(*) as count 
-    FROM payments 
-    WHERE created_at >= %s
-    """
-    total_transactions = execute_query(
-        total_transactions_query,
-        (start_date,),
-        single=True
-    )["count"]
-
-    # Get successful transactions
-    successful_transactions_query = """
-    SELECT COUNT(*) as count 
-    FROM payments 
-    WHERE status = 'CONFIRMED' AND created_at >= %s
-    """
-    successful_transactions = execute_query(
-        successful_transactions_query,
-        (start_date,),
-        single=True
-    )["count"]
+
+    total_merchants = summary["total_merchants"]
+    active_merchants = summary["active_merchants"]
+    total_transactions = summary["total_transactions"]
+    successful_transactions = summary["successful_transactions"]
+    total_deposit = summary["total_deposit"]
+    total_withdrawal = summary["total_withdrawal"]
+    pending_verification = summary["pending_verification"]
 
     # Calculate success rate
     success_rate = 0
     if total_transactions > 0:
         success_rate = round((successful_transactions / total_transactions) * 100, 2)
 
-    # Get total deposit amount
-    total_deposit_query = """
-    SELECT COALESCE(SUM(amount), 0) as total 
-    FROM payments 
-    WHERE payment_type = 'DEPOSIT' 
-    AND status = 'CONFIRMED' 
-    AND created_at >= %s
-    """
-    total_deposit = execute_query(
-        total_deposit_query,
-        (start_date,),
-        single=True
-    )["total"]
-
-    # Get total withdrawal amount
-    total_withdrawal_query = """
-    SELECT COALESCE(SUM(amount), 0) as total 
-    FROM payments 
-    WHERE payment_type = 'WITHDRAWAL' 
-    AND status = 'CONFIRMED' 
-    AND created_at >= %s
-    """
-    total_withdrawal = execute_query(
-        total_withdrawal_query,
-        (start_date,),
-        single=True
-    )["total"]
-
-    # Get pending verification count
-    pending_verification_query = """
-    SELECT COUNT(*) as count 
-    FROM payments 
-    WHERE status = 'PENDING'
-    """
-    pending_verification = execute_query(
-        pending_verification_query,
-        single=True
-    )["count"]
-
-    # Get daily transaction counts for chart
-    daily_transactions_query = """
-    SELECT 
-        DATE(created_at) as date,
-        COUNT(*) as count,
-        SUM(CASE WHEN status = 'CONFIRMED' THEN 1 ELSE 0 END) as confirmed
-    FROM 
-        payments
-    WHERE 
-        created_at >= %s
-    GROUP BY 
-        DATE(created_at)
-    ORDER BY 
-        date
-    """
-    daily_transactions = execute_query(daily_transactions_query, (start_date,))
-
-    # Format daily transaction data for chart
-    daily_chart_data = []
-    for day in daily_transactions:
-        daily_chart_data.append({
-            "date": day["date"].strftime("%Y-%m-%d"),
-            "total": day["count"],
-            "confirmed": day["confirmed"]
-        })
-
-    # Get merchant transaction counts
-    merchant_transactions_query = """
-    SELECT 
-        m.business_name,
-        COUNT(p.id) as count,
-        SUM(CASE WHEN p.status = 'CONFIRMED' THEN 1 ELSE 0 END) as confirmed
-    FROM 
-        merchants m
-    LEFT JOIN 
-        payments p ON m.id = p.merchant_id AND p.created_at >= %s
-    GROUP BY 
-        m.id, m.business_name
-    ORDER BY 
-        count DESC
-    LIMIT 10
-    """
-    merchant_transactions = execute_query(merchant_transactions_query, (start_date,))
-
-    # Format merchant transaction data
-    merchant_chart_data = []
-    for merchant in merchant_transactions:
-        merchant_chart_data.append({
-            "merchant": merchant["business_name"],
-            "total": merchant["count"],
-            "confirmed": merchant["confirmed"]
-        })
-    # Add commission data queries
-    total_commission_query = """
-    SELECT COALESCE(SUM(fee_amount), 0) as total_commission,
-           COALESCE(AVG(commission_rate), 0) as avg_commission_rate
-    FROM transaction_fees tf
-    JOIN payments p ON tf.payment_id = p.id
-    WHERE p.created_at >= %s AND p.status = 'CONFIRMED'
-    """
+    total_commission = summary["total_commission"]
+    avg_commission_rate = round(float(summary["avg_commission_rate"]), 2) if summary["avg_commission_rate"] else 0
 
-    commission_data = execute_query(
-        total_commission_query,
-        (start_date,),
-        single=True
-    )
+    # Chart rows come back from the database (decoded from JSON) ready to return
+    daily_chart_data = summary["daily_chart_data"]
+    merchant_chart_data = summary["merchant_chart_data"]
 
-    total_commission = commission_data["total_commission"]
-    avg_commission_rate = round(float(commission_data["avg_commission_rate"]), 2) if commission_data["avg_commission_rate"] else 0
-    # Get merchant commission data
-    merchant_commission_query = """
-    SELECT 
-        m.business_name,
-        COALESCE(SUM(tf.original_amount), 0) as total_amount,
-        COALESCE(SUM(tf.fee_amount), 0) as commission_amount,
-        COALESCE(SUM(tf.final_amount), 0) as final_amount,
-        COUNT(tf.id) as transaction_count
-    FROM 
-        merchants m
-    LEFT JOIN 
-        transaction_fees tf ON m.id = tf.merchant_id
-    LEFT JOIN
-        payments p ON tf.payment_id = p.id AND p.created_at >= %s AND p.status = 'CONFIRMED'
-    GROUP BY 
-        m.id, m.business_name
-    ORDER BY 
-        commission_amount DESC
-    LIMIT 10
-    """
-    merchant_commissions = execute_query(merchant_commission_query, (start_date,))
-    # Format merchant commission data
-    merchant_commission_data = []
-    for merchant in merchant_commissions:
-        if merchant["transaction_count"] > 0:
-            merchant_commission_data.append({
-                "merchant": merchant["business_name"],
-                "total_amount": merchant["total_amount"],
-                "commission": merchant["commission_amount"],
-                "final_amount": merchant["final_amount"],
-                "transaction_count": merchant["transaction_count"]
-            })
+    merchant_commission_data = summary["merchant_commission_data"]
 
     # Return stats
     return {
@@ -221,6 +200,73 @@ def get_payment_stats(days: int = 30) -> Dict[str, Any]:
         "avg_commission_rate": avg_commission_rate,
         "merchant_commission_data": merchant_commission_data
     }
+
+
+def get_payment_stats(days: int = 30) -> Dict[str, Any]:
+    """
+    Get payment statistics for dashboard (cached for up to a minute, see app.core.cache)
+
+    Parameters:
+    - days: Number of days to look back
+
+    Returns:
+    - Statistics dictionary, a copy the caller is free to modify
+    """
+    return copy.deepcopy(_get_cached_payment_stats(days))
+
+
+def refresh_report_views() -> None:
+    """
+    Refresh the materialized views behind the dashboard statistics
+    Run every REPORT_VIEW_REFRESH_INTERVAL seconds by the background refresher
+    and on demand by /tasks/refresh-report-views; reads are not blocked.
+    Skipped when another worker is already refreshing.
+    """
+    with get_db_cursor(commit=True) as cursor:
+        # Transaction-scoped, so the lock is released with the commit and
+        # never stays behind on a pooled connection
+        cursor.execute("SELECT pg_try_advisory_xact_lock(%s) AS locked", (REPORT_VIEW_REFRESH_LOCK_ID,))
+        if not cursor.fetchone()["locked"]:
+            logger.info("Report views are being refreshed by another worker, skipping")
+            return
+
+        cursor.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY mv_daily_payment_stats")
+
+
+async def _report_view_refresher() -> None:
+    """
+    Refresh the report views periodically for the lifetime of the app
+    """
+    while True:
+        try:
+            # The refresh is a blocking database call
+            await asyncio.to_thread(refresh_report_views)
+        except Exception as e:
+            logger.error(f"Error refreshing report views: {e}")
+
+        await asyncio.sleep(REPORT_VIEW_REFRESH_INTERVAL)
+
+
+async def start_report_view_refresher() -> None:
+    """
+    Start the background report view refresher on the running event loop
+    """
+    global _report_refresh_task
+
+    _report_refresh_task = asyncio.create_task(_report_view_refresher())
+
+
+async def stop_report_view_refresher() -> None:
+    """
+    Stop the background report view refresher
+    """
+    global _report_refresh_task
+
+    if _report_refresh_task is not None:
+        _report_refresh_task.cancel()
+        _report_refresh_task = None
+
+
 def get_merchant_commission_report(
         merchant_id: Optional[str] = None,
         start_date: Optional[datetime] = None,
@@ -253,62 +299,14 @@ def get_merchant_commission_report(
     
     where_clause = " AND ".join(conditions)
     
-    # Get total commission summary
-    summary_query = f"""
-    SELECT 
-        COALESCE(SUM(tf.original_amount), 0) as total_amount,
-        COALESCE(SUM(tf.fee_amount), 0) as total_commission,
-        COALESCE(SUM(tf.final_amount), 0) as final_amount,
-        COUNT(DISTINCT tf.merchant_id) as merchant_count,
-        COUNT(tf.id) as transaction_count
-    FROM 
-        transaction_fees tf
-    JOIN
-        payments p ON tf.payment_id = p.id
-    WHERE 
-        {where_clause}
-    """
-    
-    summary = execute_query(summary_query, tuple(params), single=True)
-    
-    # If merchant_id is provided, get daily breakdown
+    # If merchant_id is provided, get the summary with daily and payment type
+    # breakdowns in one pass over the merchant's fees
     if merchant_id:
-        daily_query = f"""
+        breakdown_query = f"""
         SELECT 
             DATE(p.created_at) as date,
-            COALESCE(SUM(tf.original_amount), 0) as daily_amount,
-            COALESCE(SUM(tf.fee_amount), 0) as daily_commission,
-            COALESCE(SUM(tf.final_amount), 0) as daily_final_amount,
-            COUNT(tf.id) as transaction_count
-        FROM 
-            transaction_fees tf
-        JOIN
-            payments p ON tf.payment_id = p.id
-        WHERE 
-            {where_clause}
-        GROUP BY 
-            DATE(p.created_at)
-        ORDER BY 
-            date DESC
-        """
-        
-        daily_data = execute_query(daily_query, tuple(params))
-        
-        # Format daily data
-        daily_breakdown = []
-        for day in daily_data:
-            daily_breakdown.append({
-                "date": day["date"].strftime("%Y-%m-%d"),
-                "amount": day["daily_amount"],
-                "commission": day["daily_commission"],
-                "final_amount": day["daily_final_amount"],
-                "transaction_count": day["transaction_count"]
-            })
-        
-        # Get payment type breakdown
-        payment_type_query = f"""
-        SELECT 
             p.payment_type,
+            GROUPING(DATE(p.created_at), p.payment_type) as grouping,
             COALESCE(SUM(tf.original_amount), 0) as total_amount,
             COALESCE(SUM(tf.fee_amount), 0) as total_commission,
             COALESCE(SUM(tf.final_amount), 0) as final_amount,
@@ -320,20 +318,36 @@ def get_merchant_commission_report(
         WHERE 
             {where_clause}
         GROUP BY 
-            p.payment_type
+            GROUPING SETS ((), (DATE(p.created_at)), (p.payment_type))
+        ORDER BY 
+            date DESC
         """
         
-        payment_types = execute_query(payment_type_query, tuple(params))
+        rows = execute_query(breakdown_query, tuple(params))
         
-        # Format payment type data
+        # Split the rows by grouping set: 3 is the overall summary, 1 a day
+        # and 2 a payment type
+        summary = None
+        daily_breakdown = []
         payment_type_breakdown = {}
-        for pt in payment_types:
-            payment_type_breakdown[pt["payment_type"]] = {
-                "amount": pt["total_amount"],
-                "commission": pt["total_commission"],
-                "final_amount": pt["final_amount"],
-                "transaction_count": pt["transaction_count"]
-            }
+        for row in rows:
+            if row["grouping"] == 3:
+                summary = row
+            elif row["grouping"] == 1:
+                daily_breakdown.append({
+                    "date": row["date"].isoformat(),
+                    "amount": row["total_amount"],
+                    "commission": row["total_commission"],
+                    "final_amount": row["final_amount"],
+                    "transaction_count": row["transaction_count"]
+                })
+            else:
+                payment_type_breakdown[row["payment_type"]] = {
+                    "amount": row["total_amount"],
+                    "commission": row["total_commission"],
+                    "final_amount": row["final_amount"],
+                    "transaction_count": row["transaction_count"]
+                }
         
         return {
             "summary": {
@@ -347,42 +361,56 @@ def get_merchant_commission_report(
             "payment_type_breakdown": payment_type_breakdown
         }
     else:
-        # Get merchant breakdown for admin view
-        merchant_query = f"""
+        # Get total commission summary
+        summary_query = f"""
         SELECT 
-            m.id, m.business_name,
             COALESCE(SUM(tf.original_amount), 0) as total_amount,
             COALESCE(SUM(tf.fee_amount), 0) as total_commission,
             COALESCE(SUM(tf.final_amount), 0) as final_amount,
-            COALESCE(AVG(tf.commission_rate), 0) as avg_commission_rate,
+            COUNT(DISTINCT tf.merchant_id) as merchant_count,
             COUNT(tf.id) as transaction_count
         FROM 
-            merchants m
-        LEFT JOIN 
-            transaction_fees tf ON m.id = tf.merchant_id
-        LEFT JOIN
-            payments p ON tf.payment_id = p.id AND {where_clause}
-        GROUP BY 
-            m.id, m.business_name
-        ORDER BY 
-            total_commission DESC
+            transaction_fees tf
+        JOIN
+            payments p ON tf.payment_id = p.id
+        WHERE 
+            {where_clause}
         """
         
-        merchants = execute_query(merchant_query, tuple(params))
+        summary = execute_query(summary_query, tuple(params), single=True)
         
-        # Format merchant data
-        merchant_breakdown = []
-        for merchant in merchants:
-            if merchant["transaction_count"] > 0:
-                merchant_breakdown.append({
-                    "id": merchant["id"],
-                    "business_name": merchant["business_name"],
-                    "total_amount": merchant["total_amount"],
-                    "commission": merchant["total_commission"],
-                    "final_amount": merchant["final_amount"],
-                    "avg_commission_rate": float(merchant["avg_commission_rate"]),
-                    "transaction_count": merchant["transaction_count"]
-                })
+        # Get merchant breakdown for admin view: only merchants with fees in
+        # the window, shaped as the response rows
+        merchant_query = f"""
+        SELECT 
+            m.id, m.business_name,
+            f.total_amount, f.commission, f.final_amount,
+            f.avg_commission_rate, f.transaction_count
+        FROM 
+            (
+                SELECT 
+                    tf.merchant_id,
+                    SUM(tf.original_amount) as total_amount,
+                    SUM(tf.fee_amount) as commission,
+                    SUM(tf.final_amount) as final_amount,
+                    AVG(tf.commission_rate)::float8 as avg_commission_rate,
+                    COUNT(*) as transaction_count
+                FROM 
+                    transaction_fees tf
+                JOIN
+                    payments p ON tf.payment_id = p.id
+                WHERE 
+                    {where_clause}
+                GROUP BY 
+                    tf.merchant_id
+            ) f
+        JOIN 
+            merchants m ON m.id = f.merchant_id
+        ORDER BY 
+            commission DESC
+        """
+        
+        merchant_breakdown = execute_query(merchant_query, tuple(params))
         
         return {
             "summary": {
@@ -404,10 +432,17 @@ def get_merchant_reports(
         status: Optional[str] = None,
         payment_type: Optional[str] = None,
         page: int = 1,
-        page_size: int = 20
+        page_size: int = 20,
+        cursor_created_at: Optional[datetime] = None,
+        cursor_id: Optional[str] = None
 ) -> Dict[str, Any]:
     """
-    Get payment reports for a merchant
+    Get payment reports for a merchant, newest first
+
+    Pages can be keyset-paginated: pass the created_at and id of the last
+    payment of the previous page as the cursor to fetch the next one. Cursor
+    pages skip the total count, so total and pages are None; has_more tells
+    whether another page follows.
 
     Parameters:
     - merchant_id: Merchant ID
@@ -415,80 +450,92 @@ def get_merchant_reports(
     - end_date: End date filter
     - status: Payment status filter
     - payment_type: Payment type filter
-    - page: Page number
+    - page: Page number (only used without a cursor)
     - page_size: Page size
+    - cursor_created_at: created_at of the last payment already returned
+    - cursor_id: id of the last payment already returned
 
     Returns:
     - Paginated payment reports
     """
+    use_cursor = cursor_created_at is not None and cursor_id is not None
+
     # Calculate offset
     offset = (page - 1) * page_size
 
-    # Base query
-    query = """
-    SELECT 
-        p.id, p.reference, p.trxn_hash_key, p.payment_type,
-        p.payment_method, p.amount, p.currency, p.status,
-        p.utr_number, p.created_at, p.updated_at
-    FROM 
-        payments p
-    WHERE 
-        p.merchant_id = %s
-    """
-
-    # Count query
-    count_query = """
-    SELECT 
-        COUNT(*) as count
-    FROM 
-        payments p
-    WHERE 
-        p.merchant_id = %s
-    """
-
-    # Build query parameters
-    query_params = [merchant_id]
-    count_params = [merchant_id]
+    # Filters shared by the page and its total count
+    filters = "p.merchant_id = %s"
+    filter_params = [merchant_id]
 
     # Add filters
     if start_date:
-        query += " AND p.created_at >= %s"
-        count_query += " AND p.created_at >= %s"
-        query_params.append(start_date)
-        count_params.append(start_date)
+        filters += " AND p.created_at >= %s"
+        filter_params.append(start_date)
 
     if end_date:
-        query += " AND p.created_at <= %s"
-        count_query += " AND p.created_at <= %s"
-        query_params.append(end_date)
-        count_params.append(end_date)
+        filters += " AND p.created_at <= %s"
+        filter_params.append(end_date)
 
     if status:
-        query += " AND p.status = %s"
-        count_query += " AND p.status = %s"
-        query_params.append(status)
-        count_params.append(status)
+        filters += " AND p.status = %s"
+        filter_params.append(status)
 
     if payment_type:
-        query += " AND p.payment_type = %s"
-        count_query += " AND p.payment_type = %s"
-        query_params.append(payment_type)
-        count_params.append(payment_type)
+        filters += " AND p.payment_type = %s"
+        filter_params.append(payment_type)
+
+    # Offset pages carry the total count of matches on every row, so the
+    # page and the count come back in one round trip
+    query = f"""
+    SELECT 
+        p.id, p.reference, p.trxn_hash_key, p.payment_type,
+        p.payment_method, p.amount, p.currency, p.status,
+        p.utr_number, p.created_at, p.updated_at
+        {"" if use_cursor else ", COUNT(*) OVER () as total_count"}
+    FROM 
+        payments p
+    WHERE 
+        {filters}
+    """
+    query_params = list(filter_params)
+
+    if use_cursor:
+        query += " AND (p.created_at, p.id) < (%s, %s)"
+        query_params.extend([cursor_created_at, cursor_id])
 
     # Add order by
-    query += " ORDER BY p.created_at DESC"
+    query += " ORDER BY p.created_at DESC, p.id DESC"
 
     # Add pagination
-    query += " LIMIT %s OFFSET %s"
-    query_params.extend([page_size, offset])
+    if use_cursor:
+        # One extra row tells whether another page follows
+        query += " LIMIT %s"
+        query_params.append(page_size + 1)
+    else:
+        query += " LIMIT %s OFFSET %s"
+        query_params.extend([page_size, offset])
 
-    # Execute queries
+    # Execute query
     payments = execute_query(query, tuple(query_params))
-    count_result = execute_query(count_query, tuple(count_params), single=True)
 
-    # Calculate total pages
-    total = count_result["count"]
-    pages = (total + page_size - 1) // page_size
+    # Calculate total pages (offset pages only; counting scans every match)
+    total = pages = None
+    if use_cursor:
+        has_more = len(payments) > page_size
+        payments = payments[:page_size]
+    else:
+        if payments:
+            total = payments[0]["total_count"]
+            for payment in payments:
+                del payment["total_count"]
+        elif offset:
+            # Past the last page: no row to carry the count
+            count_query = f"SELECT COUNT(*) as count FROM payments p WHERE {filters}"
+            total = execute_query(count_query, tuple(filter_params), single=True)["count"]
+        else:
+            total = 0
+        pages = (total + page_size - 1) // page_size
+        has_more = page < pages
 
     # Return results
     return {
@@ -496,7 +543,8 @@ def get_merchant_reports(
         "total": total,
         "page": page,
         "page_size": page_size,
-        "pages": pages
+        "pages": pages,
+        "has_more": has_more
     }
 
 
@@ -602,15 +650,73 @@ def get_merchant_reports(
 #         "headers": headers,
 #         "rows": rows
 #     }
-def generate_payments_csv(
+
+
+# Look-back window the admin export applies when neither a merchant nor a
+# start date is given (see admin.export_payments_csv)
+EXPORT_DEFAULT_DAYS = 90
+
+# Spooled exports move from memory to a temporary file past this size
+EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+
+
+def _crlf_chunks(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    """
+    Turn COPY's \n row endings into the \r\n the csv module writes
+
+    Newlines inside quoted fields are left alone, as csv.writer does.
+
+    Parameters:
+    - chunks: CSV data as written by COPY
+
+    Yields:
+    - The same data with \r\n row endings
+    """
+    in_quotes = False
+
+    for chunk in chunks:
+        parts = chunk.split(b'"')
+
+        for i, part in enumerate(parts):
+            # Every part after the first follows a quote character
+            if i:
+                in_quotes = not in_quotes
+            if not in_quotes:
+                parts[i] = part.replace(b"\n", b"\r\n")
+
+        yield b'"'.join(parts)
+
+
+def _read_chunks(output: SpooledTemporaryFile, chunk_size: int) -> Iterator[bytes]:
+    # Hand out the spooled export, then drop it
+    try:
+        while True:
+            chunk = output.read(chunk_size)
+            if not chunk:
+                break
+
+            yield chunk
+    finally:
+        output.close()
+
+
+def stream_payments_csv(
         merchant_id: Optional[str] = None,
         payment_type: Optional[str] = None,
         status: Optional[str] = None,
         start_date: Optional[datetime] = None,
-        end_date: Optional[datetime] = None
-) -> Dict[str, Any]:
+        end_date: Optional[datetime] = None,
+        chunk_size: int = 64 * 1024
+) -> Iterator[bytes]:
     """
-    Generate CSV data for payments export
+    Export payments as CSV, ready to stream
+
+    PostgreSQL writes the CSV itself with COPY before this returns, so query
+    errors are raised here rather than halfway through a response. The output
+    is spooled (to disk once it outgrows EXPORT_SPOOL_SIZE) and handed out in
+    chunks, so the export is never held in memory as a whole. The format
+    matches the csv module's: \r\n row endings, commission rate with two
+    decimals and commission rounded half to even.
 
     Parameters:
     - merchant_id: Filter by merchant ID
@@ -618,28 +724,47 @@ def generate_payments_csv(
     - status: Filter by status
     - start_date: Start date filter
     - end_date: End date filter
+    - chunk_size: Number of bytes per yielded chunk
 
     Returns:
-    - CSV data dictionary with headers and rows
+    - Iterator over the CSV data, starting with the header row
     """
-    # Base query
+    # Base query; the column aliases are the CSV headers. Confirmed payments
+    # without a recorded fee get their commission calculated from the rate.
+    # Empty text is sent as NULL so COPY writes it unquoted.
     query = """
     SELECT 
-        p.id, p.reference, p.trxn_hash_key, 
-        p.payment_type, p.payment_method, p.amount, 
-        p.currency, p.status, p.utr_number,
-        p.account_name, p.account_number, p.bank, p.bank_ifsc,
-        p.created_at, p.updated_at, 
-        p.remarks, m.business_name as merchant_name,
-        m.commission_rate,
-        COALESCE(tf.fee_amount, 0) as commission_amount,
-        COALESCE(tf.final_amount, p.amount) as final_amount
+        p.id as "ID", NULLIF(p.reference, '') as "Reference", p.trxn_hash_key as "Transaction Hash", 
+        p.payment_type as "Type", p.payment_method as "Method", p.amount as "Amount", 
+        p.currency as "Currency", p.status as "Status", NULLIF(p.utr_number, '') as "UTR Number",
+        NULLIF(p.account_name, '') as "Account Name", NULLIF(p.account_number, '') as "Account Number",
+        NULLIF(p.bank, '') as "Bank", NULLIF(p.bank_ifsc, '') as "IFSC Code",
+        to_char(p.created_at, 'YYYY-MM-DD HH24:MI:SS') as "Created At",
+        to_char(p.updated_at, 'YYYY-MM-DD HH24:MI:SS') as "Updated At",
+        NULLIF(p.remarks, '') as "Remarks", NULLIF(m.business_name, '') as "Merchant",
+        to_char(COALESCE(m.commission_rate, 0), 'FM999990.00') as "Commission Rate (%%)",
+        CASE WHEN c.calculated THEN c.fee ELSE COALESCE(tf.fee_amount, 0) END as "Commission Amount",
+        CASE WHEN c.calculated THEN p.amount - c.fee ELSE COALESCE(NULLIF(tf.final_amount, 0), p.amount) END as "Final Amount"
     FROM 
         payments p
     JOIN 
         merchants m ON p.merchant_id = m.id
     LEFT JOIN
         transaction_fees tf ON p.id = tf.payment_id
+    CROSS JOIN LATERAL (
+        SELECT p.amount * m.commission_rate / 100 as raw_fee
+    ) r
+    CROSS JOIN LATERAL (
+        SELECT 
+            COALESCE(tf.fee_amount, 0) = 0 AND m.commission_rate > 0
+                AND p.status = 'CONFIRMED' as calculated,
+            -- Half to even, like Python's round()
+            CASE 
+                WHEN r.raw_fee - trunc(r.raw_fee) = 0.5 AND trunc(r.raw_fee)::bigint %% 2 = 0
+                THEN trunc(r.raw_fee)
+                ELSE round(r.raw_fee)
+            END::int as fee
+    ) c
     WHERE 
         1=1
     """
@@ -671,56 +796,14 @@ def generate_payments_csv(
     # Add order by
     query += " ORDER BY p.created_at DESC"
 
-    # Execute query
-    payments = execute_query(query, tuple(query_params) if query_params else None)
-
-    # Define CSV headers
-    headers = [
-        "ID", "Reference", "Transaction Hash", "Type", "Method",
-        "Amount", "Currency", "Status", "UTR Number",
-        "Account Name", "Account Number", "Bank", "IFSC Code",
-        "Created At", "Updated At", "Remarks", "Merchant",
-        "Commission Rate (%)", "Commission Amount", "Final Amount"  # New headers
-    ]
-
-    # Prepare rows
-    rows = []
-    for payment in payments:
-        # Calculate commission amount if not available in database
-        commission_rate = payment.get("commission_rate", 0) or 0
-        amount = payment.get("amount", 0) or 0
-        commission_amount = payment.get("commission_amount", 0) or 0
-        final_amount = payment.get("final_amount", amount) or amount
-        
-        # If commission amount is 0 but we have a rate, calculate it
-        if commission_amount == 0 and commission_rate > 0 and payment["status"] == "CONFIRMED":
-            commission_amount = round(amount * commission_rate / 100)
-            final_amount = amount - commission_amount
-        
-        rows.append([
-            payment["id"],
-            payment["reference"],
-            payment["trxn_hash_key"],
-            payment["payment_type"],
-            payment["payment_method"],
-            amount,
-            payment["currency"],
-            payment["status"],
-            payment["utr_number"] or "",
-            payment["account_name"] or "",
-            payment["account_number"] or "",
-            payment["bank"] or "",
-            payment["bank_ifsc"] or "",
-            payment["created_at"].strftime("%Y-%m-%d %H:%M:%S"),
-            payment["updated_at"].strftime("%Y-%m-%d %H:%M:%S"),
-            payment["remarks"] or "",
-            payment["merchant_name"],
-            f"{commission_rate:.2f}",  # Format as percentage with 2 decimal places
-            commission_amount,
-            final_amount
-        ])
+    output = SpooledTemporaryFile(max_size=EXPORT_SPOOL_SIZE)
 
-    return {
-        "headers": headers,
-        "rows": rows
-    }
\ No newline at end of file
+    try:
+        copy_to(query, output, tuple(query_params))
+    except Exception:
+        output.close()
+        raise
+
+    output.seek(0)
+
+    return _crlf_chunks(_read_chunks(output, chunk_size))
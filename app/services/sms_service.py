@@ -1,6 +1,7 @@
 import re
 import logging
-from typing import Dict, Any, Optional, List, Tuple
+from collections import defaultdict, deque
+from typing import Deque, Dict, Any, Optional, List, Tuple
 from datetime import datetime
 
 from app.db.connection import execute_query
@@ -9,35 +10,52 @@ from app.utils.validators import validate_utr_number
 
 logger = logging.getLogger(__name__)
 
-# Bank SMS patterns for different banks
+# Collapses whitespace runs and newlines in incoming SMS text
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+# Fallbacks when no bank pattern matches: any amount and any UTR-like string
+AMOUNT_PATTERN = re.compile(r'(?:Rs\.?|INR)[\s]*([0-9,]+\.[0-9]+)')
+UTR_PATTERN = re.compile(r'(?:UPI Ref|UPI|Ref|Reference|UTR)[:\s]*[\s]*([A-Za-z0-9]{10,22})')
+
+# Bank SMS patterns for different banks, compiled once at import. search()
+# already scans for the start of a match, so the patterns must not begin
+# with ".*": the extra backtracking makes long messages take seconds.
 BANK_PATTERNS = {
     # SBI pattern
     "SBI": {
-        "credit": r"(?:.*credited with Rs\.|.*credited by Rs\.|.*deposited in your account)[\s]*([0-9,]+\.[0-9]+).*(?:UPI|UPI Ref no|Ref no)[:\s]*([A-Za-z0-9]{10,22})",
+        "credit": re.compile(r"(?:credited with Rs\.|credited by Rs\.|deposited in your account)[\s]*([0-9,]+\.[0-9]+).*(?:UPI|UPI Ref no|Ref no)[:\s]*([A-Za-z0-9]{10,22})"),
         "banks": ["SBIINB", "SBIATM", "SBI", "STBANKNG"],
     },
     # HDFC pattern
     "HDFC": {
-        "credit": r"(?:.*credited to your A/c|.*Money Received)[\s]*(?:Rs\.|INR|Rs)[\s]*([0-9,]+\.[0-9]+).*(?:UPI Ref|Ref)[:\s]*([A-Za-z0-9]{10,22})",
+        "credit": re.compile(r"(?:credited to your A/c|Money Received)[\s]*(?:Rs\.|INR|Rs)[\s]*([0-9,]+\.[0-9]+).*(?:UPI Ref|Ref)[:\s]*([A-Za-z0-9]{10,22})"),
         "banks": ["HDFCBK", "HDFC", "HDFCBANK"],
     },
     # ICICI pattern
     "ICICI": {
-        "credit": r"(?:.*credited with INR|.*credited with Rs.)[\s]*([0-9,]+\.[0-9]+).*(?:UPI|UPI REF|REF)[:\s]*([A-Za-z0-9]{10,22})",
+        "credit": re.compile(r"(?:credited with INR|credited with Rs.)[\s]*([0-9,]+\.[0-9]+).*(?:UPI|UPI REF|REF)[:\s]*([A-Za-z0-9]{10,22})"),
         "banks": ["ICICIB", "ICICI", "ICICIBANK"],
     },
     # Axis pattern
     "AXIS": {
-        "credit": r"(?:.*credited with INR|.*credited by INR|.*Money received)[\s]*([0-9,]+\.[0-9]+).*(?:UPI Ref|UPI-Ref|Ref)[:\s]*([A-Za-z0-9]{10,22})",
+        "credit": re.compile(r"(?:credited with INR|credited by INR|Money received)[\s]*([0-9,]+\.[0-9]+).*(?:UPI Ref|UPI-Ref|Ref)[:\s]*([A-Za-z0-9]{10,22})"),
         "banks": ["AXIS", "AXISBANK", "AxisBk"],
     },
     # Default pattern (generic attempt)
     "DEFAULT": {
-        "credit": r"(?:.*credited|.*deposited|.*received)[\s]*(?:Rs|Rs\.|INR|Amount)?[\s]*([0-9,]+\.[0-9]+).*(?:UPI|UPI Ref|Ref|Reference|UTR)[:\s]*[\s]*([A-Za-z0-9]{10,22})",
+        "credit": re.compile(r"(?:credited|deposited|received)[\s]*(?:Rs|Rs\.|INR|Amount)?[\s]*([0-9,]+\.[0-9]+).*(?:UPI|UPI Ref|Ref|Reference|UTR)[:\s]*[\s]*([A-Za-z0-9]{10,22})"),
         "banks": [],
     },
 }
 
+# (sender code, bank) pairs in BANK_PATTERNS order, so the first listed bank
+# still wins when a sender contains codes of several banks
+SENDER_BANK_CODES = tuple(
+    (bank_code.upper(), bank)
+    for bank, data in BANK_PATTERNS.items()
+    for bank_code in data["banks"]
+)
+
 async def process_bank_sms(sender: str, message: str, timestamp: Optional[datetime] = None) -> Dict[str, Any]:
     """
     Process a bank SMS message, extract transaction details, and match with pending transactions
@@ -50,8 +68,67 @@ async def process_bank_sms(sender: str, message: str, timestamp: Optional[dateti
     Returns:
     - Processing result details
     """
+    sms = parse_bank_sms(sender, message)
+    if "success" in sms:
+        return sms
+    
+    # Find matching pending transactions by amount
+    matching_transactions = find_matching_transactions(sms["amount"])
+    
+    # Get the first matching transaction
+    # In a production system, you might want a more sophisticated matching algorithm
+    # or queue these for manual review if there are multiple matches
+    return _verify_sms_payment(sms, matching_transactions[0] if matching_transactions else None)
+
+
+def process_bank_sms_batch(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Process a burst of forwarded bank SMS messages
+    Blocking (database queries and payment verification); call from a
+    plain def endpoint so it runs in the threadpool.
+    
+    All messages are parsed first, the pending transactions for every amount
+    are fetched in one query, and each SMS then takes the oldest pending
+    transaction of its amount that an earlier SMS in the batch has not taken.
+    
+    Parameters:
+    - messages: SMS dicts with sender, message and optional timestamp
+    
+    Returns:
+    - Processing result details, in the order of the messages
+    """
+    parsed = [parse_bank_sms(sms["sender"], sms["message"]) for sms in messages]
+    
+    matching_transactions = find_matching_transactions_bulk(
+        [sms["amount"] for sms in parsed if "success" not in sms]
+    )
+    
+    results = []
+    for sms in parsed:
+        if "success" in sms:
+            results.append(sms)
+            continue
+        
+        candidates = matching_transactions.get(sms["amount"])
+        results.append(_verify_sms_payment(sms, candidates.popleft() if candidates else None))
+    
+    return results
+
+
+def parse_bank_sms(sender: str, message: str) -> Dict[str, Any]:
+    """
+    Normalize a bank SMS and extract its bank, amount and UTR
+    
+    Parameters:
+    - sender: SMS sender (bank identification)
+    - message: SMS content
+    
+    Returns:
+    - Dict with bank, amount (integer), utr and the normalized message, or a
+      failed processing result (with "success" set to False)
+    """
     # Standardize the message (remove extra spaces, newlines)
-    message = re.sub(r'\s+', ' ', message).strip()
+    message = WHITESPACE_PATTERN.sub(' ', message).strip()
     
     # Try to identify the bank and extract transaction details
     bank_name, amount, utr = extract_transaction_details(sender, message)
@@ -78,10 +155,24 @@ async def process_bank_sms(sender: str, message: str, timestamp: Optional[dateti
             "message": message
         }
     
-    # Find matching pending transactions by amount
-    matching_transactions = find_matching_transactions(amount_int)
+    return {"bank": bank_name, "amount": amount_int, "utr": utr, "message": message}
+
+
+def _verify_sms_payment(sms: Dict[str, Any], transaction: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Confirm the pending transaction matched to a parsed bank SMS
     
-    if not matching_transactions:
+    Parameters:
+    - sms: Parsed SMS from parse_bank_sms
+    - transaction: Matching pending transaction, or None when nothing matched
+    
+    Returns:
+    - Processing result details
+    """
+    amount_int = sms["amount"]
+    utr = sms["utr"]
+    
+    if transaction is None:
         logger.warning(f"No matching pending transactions found for amount: {amount_int}, UTR: {utr}")
         return {
             "success": False,
@@ -89,36 +180,32 @@ async def process_bank_sms(sender: str, message: str, timestamp: Optional[dateti
             "amount": amount_int,
             "utr": utr
         }
-
-    # Get the first matching transaction
-    # In a production system, you might want a more sophisticated matching algorithm
-    # or queue these for manual review if there are multiple matches
-    transaction = matching_transactions[0]
     
+    payment_id = str(transaction["id"])
+
     # Verify the payment
     try:
-        payment_id = transaction["id"]
         # Use 'SYSTEM' as verifier or create a dedicated system user ID
         system_user_id = "00000000-0000-0000-0000-000000000000"
         
         # Verify the payment with the extracted UTR
         verify_result = verify_payment(
-            payment_id=str(payment_id),
+            payment_id=payment_id,
             utr_number=utr,
             verified_by=system_user_id,
             verification_method="SMS",
-            remarks=f"Auto-verified via SMS from {bank_name}. Message: {message[:100]}..."
+            remarks=f"Auto-verified via SMS from {sms['bank']}. Message: {sms['message'][:100]}..."
         )
         
         logger.info(f"Successfully verified payment {payment_id} with UTR {utr} from SMS")
         
         return {
             "success": True,
-            "payment_id": str(payment_id),
+            "payment_id": payment_id,
             "merchant_id": str(transaction["merchant_id"]),
             "amount": amount_int,
             "utr": utr,
-            "bank": bank_name,
+            "bank": sms["bank"],
             "status": "CONFIRMED"
         }
         
@@ -127,7 +214,7 @@ async def process_bank_sms(sender: str, message: str, timestamp: Optional[dateti
         return {
             "success": False,
             "reason": f"Verification error: {str(e)}",
-            "payment_id": str(transaction["id"]),
+            "payment_id": payment_id,
             "amount": amount_int,
             "utr": utr
         }
@@ -148,17 +235,16 @@ def extract_transaction_details(sender: str, message: str) -> Tuple[str, Optiona
     sender = sender.upper().strip()
     
     # Try to identify the bank
-    identified_bank = "DEFAULT"
-    for bank, data in BANK_PATTERNS.items():
-        if any(bank_code in sender for bank_code in data["banks"]):
-            identified_bank = bank
-            break
-            
+    identified_bank = next(
+        (bank for bank_code, bank in SENDER_BANK_CODES if bank_code in sender),
+        "DEFAULT"
+    )
+    
     # Get the appropriate regex pattern
     pattern = BANK_PATTERNS[identified_bank]["credit"]
     
     # Try to match the pattern
-    match = re.search(pattern, message)
+    match = pattern.search(message)
     
     if match:
         amount = match.group(1)
@@ -173,7 +259,7 @@ def extract_transaction_details(sender: str, message: str) -> Tuple[str, Optiona
     
     # If no match with specific bank pattern, try the default pattern
     if identified_bank != "DEFAULT":
-        default_match = re.search(BANK_PATTERNS["DEFAULT"]["credit"], message)
+        default_match = BANK_PATTERNS["DEFAULT"]["credit"].search(message)
         if default_match:
             amount = default_match.group(1)
             utr = default_match.group(2)
@@ -186,8 +272,8 @@ def extract_transaction_details(sender: str, message: str) -> Tuple[str, Optiona
             return identified_bank, amount, utr
     
     # If still no match, try to find any amount and UTR-like string
-    amount_match = re.search(r'(?:Rs\.?|INR)[\s]*([0-9,]+\.[0-9]+)', message)
-    utr_match = re.search(r'(?:UPI Ref|UPI|Ref|Reference|UTR)[:\s]*[\s]*([A-Za-z0-9]{10,22})', message)
+    amount_match = AMOUNT_PATTERN.search(message)
+    utr_match = UTR_PATTERN.search(message)
     
     amount = amount_match.group(1) if amount_match else None
     utr = utr_match.group(1) if utr_match else None
@@ -225,4 +311,38 @@ def find_matching_transactions(amount: int) -> List[Dict[str, Any]]:
     """
     
     matching_transactions = execute_query(query, (amount,))
-    return matching_transactions
\ No newline at end of file
+    return matching_transactions
+
+
+def find_matching_transactions_bulk(amounts: List[int]) -> Dict[int, Deque[Dict[str, Any]]]:
+    """
+    Find pending transactions matching any of the given amounts in one query
+    
+    Parameters:
+    - amounts: Transaction amounts
+    
+    Returns:
+    - Matching transactions per amount, oldest first (taken with popleft)
+    """
+    if not amounts:
+        return {}
+    
+    query = """
+    SELECT 
+        id, merchant_id, reference, trxn_hash_key, payment_type, 
+        payment_method, amount, status
+    FROM 
+        payments
+    WHERE 
+        status = 'PENDING' 
+        AND payment_type = 'DEPOSIT'
+        AND amount = ANY(%s)
+    ORDER BY
+        amount, created_at ASC
+    """
+    
+    matching_transactions = defaultdict(deque)
+    for transaction in execute_query(query, (list(set(amounts)),)):
+        matching_transactions[transaction["amount"]].append(transaction)
+    
+    return matching_transactions
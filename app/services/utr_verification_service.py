@@ -1,13 +1,23 @@
 import logging
 import re
+from collections import defaultdict, deque
 from typing import Dict, Any, List, Optional, Tuple
 import uuid
 
-from app.db.connection import execute_query
+import psycopg2
+
+from app.db.connection import execute_query, execute_values_query
 from app.utils.validators import validate_utr_number
 
 logger = logging.getLogger(__name__)
 
+# UTR numbers after a UTR/Ref label; the character class already limits
+# matches to valid UTR numbers
+UTR_TEXT_PATTERN = re.compile(r'(?:UTR|Ref\.?|Reference)\s*(?:No\.?|Number)?[:\s]*([A-Za-z0-9]{12,22})(?![0-9\-])')
+
+# The same in scientific notation (e.g., 1.23457E+11), as spreadsheets export it
+UTR_TEXT_SCIENTIFIC_PATTERN = re.compile(r'(?:UTR|Ref\.?|Reference)\s*(?:No\.?|Number)?[:\s]*(\d+\.\d+E\+\d+)(?![0-9\-])')
+
 
 def verify_payment_with_utr(payment_id: str, utr_number: str, verified_by: str, remarks: Optional[str] = None) -> Dict[
     str, Any]:
@@ -74,6 +84,20 @@ def verify_payment_with_utr(payment_id: str, utr_number: str, verified_by: str,
         raise
 
 
+def _verify_matches_one_by_one(matches: List[Tuple[str, str]], verified_by: str) -> int:
+    # Fallback for match_utr_from_bank_statement; returns the confirmed count
+    matched_count = 0
+
+    for payment_id, utr_number in matches:
+        try:
+            verify_payment_with_utr(payment_id, utr_number, verified_by, "Auto-verified via bank statement")
+            matched_count += 1
+        except (ValueError, psycopg2.errors.UniqueViolation) as e:
+            logger.error(f"Error verifying payment {payment_id} with UTR {utr_number}: {e}")
+
+    return matched_count
+
+
 def match_utr_from_bank_statement(utr_data: List[Dict[str, Any]], verified_by: str) -> Tuple[int, int]:
     """
     Match UTR numbers from bank statement with pending payments
@@ -102,35 +126,75 @@ def match_utr_from_bank_statement(utr_data: List[Dict[str, Any]], verified_by: s
 
         pending_payments = execute_query(query)
 
-        # Create a lookup dictionary by amount
-        payment_lookup = {}
+        # Create a lookup queue of pending payments by amount
+        payment_lookup = defaultdict(deque)
         for payment in pending_payments:
-            amount = payment["amount"]
-            if amount not in payment_lookup:
-                payment_lookup[amount] = []
-            payment_lookup[amount].append(payment)
+            payment_lookup[payment["amount"]].append(payment)
 
         # Match UTRs with payments
+        matches = []
+        matched_utrs = set()
         for utr_item in utr_data:
             utr_number = utr_item["utr_number"]
             amount = utr_item["amount"]
 
             # Look for matching payment by amount
-            if amount in payment_lookup and payment_lookup[amount]:
-                payment = payment_lookup[amount].pop(0)
-
-                try:
-                    # Verify payment
-                    verify_payment_with_utr(
-                        payment_id=payment["id"],
-                        utr_number=utr_number,
-                        verified_by=verified_by,
-                        remarks="Auto-verified via bank statement"
-                    )
-
-                    matched_count += 1
-                except Exception as e:
-                    logger.error(f"Error verifying payment {payment['id']} with UTR {utr_number}: {e}")
+            if payment_lookup.get(amount):
+                payment = payment_lookup[amount].popleft()
+
+                # A UTR can confirm only one payment, also within one statement
+                if not validate_utr_number(utr_number) or utr_number in matched_utrs:
+                    logger.error(f"Error verifying payment {payment['id']} with UTR {utr_number}: invalid or duplicate UTR")
+                    continue
+
+                matched_utrs.add(utr_number)
+                matches.append((payment["id"], utr_number))
+
+        if matches:
+            # Confirm every match in one statement, skipping UTRs that an
+            # earlier confirmed payment already carries
+            update_query = """
+            UPDATE payments p
+            SET 
+                status = 'CONFIRMED',
+                utr_number = v.utr_number,
+                verified_by = v.verified_by,
+                verification_method = 'MANUAL',
+                remarks = 'Auto-verified via bank statement',
+                updated_at = NOW()
+            FROM 
+                (VALUES %s) AS v(id, utr_number, verified_by)
+            WHERE 
+                p.id = v.id AND p.status = 'PENDING'
+                AND NOT EXISTS (
+                    SELECT 1 FROM payments c
+                    WHERE c.utr_number = v.utr_number AND c.status = 'CONFIRMED'
+                )
+            RETURNING p.id
+            """
+
+            try:
+                confirmed = execute_values_query(
+                    update_query,
+                    [(payment_id, utr_number, verified_by) for payment_id, utr_number in matches],
+                    template="(%s::uuid, %s, %s::uuid)",
+                    fetch=True,
+                    page_size=1000
+                )
+            except psycopg2.errors.UniqueViolation:
+                # Another payment was confirmed with one of these UTRs
+                # concurrently and the whole batch was rolled back; confirm
+                # the matches one by one so only the conflicting ones fail
+                logger.warning("UTR conflict while confirming bank statement matches, retrying one by one")
+                return (_verify_matches_one_by_one(matches, verified_by), total_count)
+
+            matched_count = len(confirmed)
+
+            if matched_count < len(matches):
+                confirmed_ids = {str(row["id"]) for row in confirmed}
+                for payment_id, utr_number in matches:
+                    if str(payment_id) not in confirmed_ids:
+                        logger.error(f"Error verifying payment {payment_id} with UTR {utr_number}: UTR already used or payment already processed")
 
         return (matched_count, total_count)
 
@@ -149,13 +213,7 @@ def extract_utr_from_text(text: str) -> Optional[str]:
     Returns:
     - UTR number if found, None otherwise
     """
-    # General pattern for UTR numbers
-    pattern = r'(?:UTR|Ref\.?|Reference)\s*(?:No\.?|Number)?[:\s]*([A-Za-z0-9]{12,22})(?![0-9\-])'
-
-    # Also look for scientific notation format (e.g., 1.23457E+11)
-    sci_pattern = r'(?:UTR|Ref\.?|Reference)\s*(?:No\.?|Number)?[:\s]*(\d+\.\d+E\+\d+)(?![0-9\-])'
-
-    match = re.search(pattern, text)
+    match = UTR_TEXT_PATTERN.search(text)
 
     if match:
         utr_number = match.group(1)
@@ -165,7 +223,7 @@ def extract_utr_from_text(text: str) -> Optional[str]:
             return utr_number
 
     # Try matching scientific notation
-    sci_match = re.search(sci_pattern, text)
+    sci_match = UTR_TEXT_SCIENTIFIC_PATTERN.search(text)
 
     if sci_match:
         sci_notation = sci_match.group(1)
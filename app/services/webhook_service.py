@@ -2,7 +2,8 @@ import logging
 import aiohttp
 import asyncio
 import json
-from typing import Dict, Any, Optional
+import orjson
+from typing import Dict, Any, List, Optional, Set, Tuple, Union
 
 from app.core.config import settings
 from app.core.security import generate_webhook_signature
@@ -10,12 +11,198 @@ from app.db.connection import execute_query
 
 logger = logging.getLogger(__name__)
 
+# Webhooks queued from request handlers and dispatched by a long-lived worker.
+# Both the queue and the number of deliveries in flight are bounded; webhooks
+# that don't fit stay unsent and are picked up by process_failed_webhooks.
+WEBHOOK_QUEUE_SIZE = 10_000
+WEBHOOK_MAX_IN_FLIGHT = 100
+_webhook_queue: Optional[asyncio.Queue] = None
+_webhook_loop: Optional[asyncio.AbstractEventLoop] = None
+_webhook_worker_task: Optional[asyncio.Task] = None
+_webhook_tasks: Set[asyncio.Task] = set()
+_webhook_slots: Optional[asyncio.Semaphore] = None
 
-async def send_webhook(
+# Events for merchants with batched_webhooks, keyed by (merchant ID, callback URL)
+WEBHOOK_BATCH_WINDOW = 0.25
+WEBHOOK_BATCH_SIZE = 50
+_pending_batches: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+# Failed webhooks resent side by side per process_failed_webhooks run
+WEBHOOK_RETRY_CONCURRENCY = 10
+
+# Shared HTTP session so merchant connections are pooled and kept alive
+_webhook_session: Optional[aiohttp.ClientSession] = None
+_webhook_session_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_webhook_session() -> aiohttp.ClientSession:
+    """
+    Get the shared HTTP session for the running event loop
+
+    Returns:
+    - aiohttp client session
+    """
+    global _webhook_session, _webhook_session_loop
+
+    loop = asyncio.get_running_loop()
+
+    if _webhook_session is None or _webhook_session.closed or _webhook_session_loop is not loop:
+        _webhook_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=60)
+        )
+        _webhook_session_loop = loop
+
+    return _webhook_session
+
+
+def enqueue_webhook(
         callback_url: str,
         payload: Dict[str, Any],
         webhook_secret: Optional[str],
         payment_id: Optional[str] = None,
+        batch_key: Optional[str] = None
+) -> None:
+    """
+    Queue a webhook for delivery by the background worker
+    Safe to call from synchronous code and from any thread; the payment's
+    callback status is recorded by the worker once delivery is attempted.
+
+    Parameters:
+    - callback_url: URL to send the webhook to
+    - payload: Webhook payload
+    - webhook_secret: Merchant's webhook secret
+    - payment_id: ID of the payment the webhook is for
+    - batch_key: Merchant ID to coalesce events under, or None to send on its own
+    """
+    job = (callback_url, payload, webhook_secret, payment_id, batch_key)
+
+    if _webhook_loop is not None and not _webhook_loop.is_closed():
+        _webhook_loop.call_soon_threadsafe(_put_job, job)
+        return
+
+    # Worker not running (e.g. outside the API process): send directly if we can
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        logger.warning(f"No event loop to send webhook to {callback_url}; left for retry")
+        return
+
+    _track_task(loop.create_task(send_webhook(callback_url, payload, webhook_secret, payment_id)))
+
+
+def _put_job(job: Tuple) -> None:
+    # Runs on the worker's loop
+    try:
+        _webhook_queue.put_nowait(job)
+    except asyncio.QueueFull:
+        logger.warning(f"Webhook queue full; webhook to {job[0]} left for retry")
+
+
+def _track_task(task: asyncio.Task) -> None:
+    # Keep a reference so pending deliveries are not garbage collected
+    _webhook_tasks.add(task)
+    task.add_done_callback(_webhook_tasks.discard)
+
+
+async def _webhook_worker() -> None:
+    """
+    Consume queued webhooks, dispatching each concurrently over the shared session
+    Events for batched merchants are held for up to WEBHOOK_BATCH_WINDOW seconds
+    and sent together as {"events": [...]}.
+    """
+    while True:
+        callback_url, payload, webhook_secret, payment_id, batch_key = await _webhook_queue.get()
+
+        if batch_key is None:
+            # Wait for a free slot so a burst can't open unbounded deliveries
+            await _webhook_slots.acquire()
+            task = asyncio.create_task(
+                send_webhook(callback_url, payload, webhook_secret, payment_id)
+            )
+            task.add_done_callback(lambda _: _webhook_slots.release())
+            _track_task(task)
+        else:
+            key = (batch_key, callback_url)
+            batch = _pending_batches.setdefault(key, {"events": [], "payment_ids": []})
+            batch["events"].append(payload)
+            if payment_id:
+                batch["payment_ids"].append(payment_id)
+            batch["webhook_secret"] = webhook_secret
+
+            if len(batch["events"]) >= WEBHOOK_BATCH_SIZE:
+                _flush_batch(key)
+            elif len(batch["events"]) == 1:
+                _webhook_loop.call_later(WEBHOOK_BATCH_WINDOW, _flush_batch, key)
+
+        _webhook_queue.task_done()
+
+
+def _flush_batch(key: Tuple[str, str]) -> None:
+    """
+    Send the pending events for a merchant callback URL as one webhook
+
+    Parameters:
+    - key: (merchant ID, callback URL)
+    """
+    batch = _pending_batches.pop(key, None)
+
+    if batch:
+        _track_task(asyncio.create_task(
+            send_webhook(
+                key[1],
+                {"events": batch["events"]},
+                batch["webhook_secret"],
+                batch["payment_ids"] or None
+            )
+        ))
+
+
+async def start_webhook_worker() -> None:
+    """
+    Start the background webhook worker on the running event loop
+    """
+    global _webhook_queue, _webhook_loop, _webhook_worker_task, _webhook_slots
+
+    _webhook_queue = asyncio.Queue(maxsize=WEBHOOK_QUEUE_SIZE)
+    _webhook_slots = asyncio.Semaphore(WEBHOOK_MAX_IN_FLIGHT)
+    _webhook_loop = asyncio.get_running_loop()
+    _webhook_worker_task = asyncio.create_task(_webhook_worker())
+
+
+async def stop_webhook_worker() -> None:
+    """
+    Stop the background webhook worker and close the shared session
+    """
+    global _webhook_loop, _webhook_worker_task
+
+    if _webhook_worker_task is not None:
+        _webhook_worker_task.cancel()
+        _webhook_worker_task = None
+
+    # Don't hold batched events past shutdown
+    for key in list(_pending_batches):
+        _flush_batch(key)
+
+    _webhook_loop = None
+
+    # Give in-flight deliveries a chance to finish
+    if _webhook_tasks:
+        await asyncio.wait(list(_webhook_tasks), timeout=10)
+
+    if _webhook_session is not None and not _webhook_session.closed:
+        await _webhook_session.close()
+
+
+def _as_id_list(payment_id: Union[str, List[str]]) -> List[str]:
+    # One UPDATE covers both single and batched webhooks
+    return payment_id if isinstance(payment_id, list) else [str(payment_id)]
+
+
+async def send_webhook(
+        callback_url: str,
+        payload: Dict[str, Any],
+        webhook_secret: Optional[str],
+        payment_id: Optional[Union[str, List[str]]] = None,
         attempt: int = 1
 ) -> bool:
     """
@@ -25,7 +212,7 @@ async def send_webhook(
     - callback_url: URL to send the webhook to
     - payload: Webhook payload
     - webhook_secret: Merchant's webhook secret
-    - payment_id: ID of the payment being processed
+    - payment_id: ID of the payment being processed (a list for batched webhooks)
     - attempt: Current attempt number
 
     Returns:
@@ -42,78 +229,76 @@ async def send_webhook(
             signature = generate_webhook_signature(payload, webhook_secret)
             headers["X-Webhook-Signature"] = signature
 
-        async with aiohttp.ClientSession() as session:
-            # Send the webhook
-            async with session.post(
-                    callback_url,
-                    json=payload,
-                    headers=headers,
-                    timeout=10
-            ) as response:
-                # Get response
-                status_code = response.status
-                response_text = await response.text()
-
-                # Log response
-                logger.info(f"Webhook sent to {callback_url}. Status: {status_code}")
-
-                # Update payment record if payment_id is provided
-                if payment_id:
-                    update_query = """
-                    UPDATE payments
-                    SET 
-                        callback_sent = TRUE,
-                        callback_response = %s,
-                        callback_attempts = %s
-                    WHERE 
-                        id = %s
-                    """
-                    execute_query(
-                        update_query,
-                        (response_text[:255], attempt, payment_id),
-                        fetch=False
-                    )
-
-                # Return success if status code is 2xx
-                return 200 <= status_code < 300
+        # Send the webhook
+        async with get_webhook_session().post(
+                callback_url,
+                data=orjson.dumps(payload),
+                headers=headers,
+                timeout=10
+        ) as response:
+            # Get response
+            status_code = response.status
+            response_text = await response.text()
+
+        # Log response
+        logger.info(f"Webhook sent to {callback_url}. Status: {status_code}")
+
+        # Only a 2xx counts as delivered; anything else stays due for retry
+        delivered = 200 <= status_code < 300
+        response_message = response_text[:255]
 
     except Exception as e:
         logger.error(f"Error sending webhook to {callback_url}: {e}")
+        delivered = False
+        response_message = str(e)[:255]
 
-        # Update payment record if payment_id is provided
-        if payment_id:
-            error_message = str(e)[:255]
-            update_query = """
-            UPDATE payments
-            SET 
-                callback_response = %s,
-                callback_attempts = %s
-            WHERE 
-                id = %s
-            """
-            execute_query(
-                update_query,
-                (error_message, attempt, payment_id),
-                fetch=False
+    # Update payment record if payment_id is provided
+    if payment_id:
+        update_query = """
+        UPDATE payments
+        SET 
+            callback_sent = callback_sent OR %(sent)s,
+            callback_response = %(response)s,
+            callback_attempts = %(attempt)s
+        WHERE 
+            id = ANY(%(ids)s::uuid[])
+            AND (
+                (%(sent)s AND callback_sent = FALSE)
+                OR callback_response IS DISTINCT FROM %(response)s
+                OR callback_attempts IS DISTINCT FROM %(attempt)s
             )
+        """
+        execute_query(
+            update_query,
+            {
+                "sent": delivered,
+                "response": response_message,
+                "attempt": attempt,
+                "ids": _as_id_list(payment_id)
+            },
+            fetch=False
+        )
+
+    if delivered:
+        return True
+
+    # Retry if we haven't reached the max attempts
+    if attempt < settings.WEBHOOK_RETRY_ATTEMPTS:
+        # Schedule retry with exponential backoff
+        delay = settings.WEBHOOK_RETRY_DELAY * (2 ** (attempt - 1))
+        logger.info(f"Scheduling webhook retry in {delay} seconds (attempt {attempt + 1})")
 
-        # Retry if we haven't reached the max attempts
-        if attempt < settings.WEBHOOK_RETRY_ATTEMPTS:
-            # Schedule retry with exponential backoff
-            delay = settings.WEBHOOK_RETRY_DELAY * (2 ** (attempt - 1))
-            logger.info(f"Scheduling webhook retry in {delay} seconds (attempt {attempt + 1})")
-
-            # Schedule the retry
-            asyncio.create_task(
-                retry_webhook(
-                    callback_url,
-                    payload,
-                    webhook_secret,
-                    payment_id,
-                    attempt + 1,
-                    delay
-                )
+        # Schedule the retry
+        _track_task(asyncio.create_task(
+            retry_webhook(
+                callback_url,
+                payload,
+                webhook_secret,
+                payment_id,
+                attempt + 1,
+                delay
             )
+        ))
 
         return False
 
@@ -159,24 +344,28 @@ async def process_failed_webhooks() -> None:
     query = """
     SELECT 
         p.id, p.merchant_id, p.reference, p.amount, p.status,
-        p.callback_attempts, m.callback_url, m.webhook_secret
+        p.callback_attempts, m.callback_url, m.webhook_secret, m.batched_webhooks
     FROM 
         payments p
     JOIN 
         merchants m ON p.merchant_id = m.id
     WHERE 
         p.status IN ('CONFIRMED', 'DECLINED')
-        AND (p.callback_sent = FALSE OR p.callback_attempts < %s)
+        AND p.callback_sent = FALSE
         AND p.callback_attempts < %s
+    ORDER BY 
+        p.updated_at
     LIMIT 50
     """
 
-    failed_webhooks = execute_query(
-        query,
-        (settings.WEBHOOK_RETRY_ATTEMPTS, settings.WEBHOOK_RETRY_ATTEMPTS)
-    )
+    failed_webhooks = execute_query(query, (settings.WEBHOOK_RETRY_ATTEMPTS,))
+
+    # (callback URL, payload, webhook secret, payment ID(s), attempt) per request
+    deliveries = []
+    # Merchants with batched_webhooks get their retries in the same
+    # {"events": [...]} envelope as live deliveries, one per callback URL
+    batches: Dict[Tuple[str, str], Dict[str, Any]] = {}
 
-    # Process each failed webhook
     for webhook in failed_webhooks:
         # Prepare callback data
         callback_data = {
@@ -189,14 +378,40 @@ async def process_failed_webhooks() -> None:
         if "fee_info" in webhook:
             callback_data["fee_info"] = webhook["fee_info"]
 
+        if not webhook["batched_webhooks"]:
+            deliveries.append((
+                webhook["callback_url"],
+                callback_data,
+                webhook["webhook_secret"],
+                webhook["id"],
+                webhook["callback_attempts"] + 1
+            ))
+            continue
+
+        key = (str(webhook["merchant_id"]), webhook["callback_url"])
+        batch = batches.setdefault(key, {
+            "events": [], "payment_ids": [], "attempt": 1, "webhook_secret": webhook["webhook_secret"]
+        })
+        batch["events"].append(callback_data)
+        batch["payment_ids"].append(str(webhook["id"]))
+        batch["attempt"] = max(batch["attempt"], webhook["callback_attempts"] + 1)
+
+    for (_, callback_url), batch in batches.items():
+        for start in range(0, len(batch["events"]), WEBHOOK_BATCH_SIZE):
+            deliveries.append((
+                callback_url,
+                {"events": batch["events"][start:start + WEBHOOK_BATCH_SIZE]},
+                batch["webhook_secret"],
+                batch["payment_ids"][start:start + WEBHOOK_BATCH_SIZE],
+                batch["attempt"]
+            ))
+
+    # Resend a few at a time so one slow merchant doesn't hold up the rest
+    slots = asyncio.Semaphore(WEBHOOK_RETRY_CONCURRENCY)
+
+    async def resend(delivery: Tuple) -> None:
         # Send webhook
-        await send_webhook(
-            webhook["callback_url"],
-            callback_data,
-            webhook["webhook_secret"],
-            webhook["id"],
-            webhook["callback_attempts"] + 1
-        )
+        async with slots:
+            await send_webhook(*delivery)
 
-        # Sleep briefly to avoid overwhelming the system
-        await asyncio.sleep(1)
\ No newline at end of file
+    await asyncio.gather(*(resend(delivery) for delivery in deliveries))
@@ -1,6 +1,6 @@
 import csv
 import io
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional
 from datetime import datetime
 
 
@@ -16,16 +16,17 @@ def format_csv_value(value: Any) -> str:
         return str(value)
 
 
-def generate_csv_file(headers: List[str], rows: List[List[Any]]) -> str:
+def iter_csv(headers: List[str], rows: Iterable[List[Any]], batch_size: int = 1000) -> Iterator[str]:
     """
-    Generate a CSV file as a string
+    Generate a CSV file in chunks, for StreamingResponse
 
     Parameters:
     - headers: List of column headers
-    - rows: List of rows, each containing values for each column
+    - rows: Rows, each containing values for each column; consumed lazily
+    - batch_size: Number of rows per yielded chunk
 
     Returns:
-    - CSV content as a string
+    - Iterator over CSV content chunks
     """
     output = io.StringIO()
     writer = csv.writer(output)
@@ -33,12 +34,30 @@ def generate_csv_file(headers: List[str], rows: List[List[Any]]) -> str:
     # Write header row
     writer.writerow(headers)
 
-    # Write data rows
-    for row in rows:
-        formatted_row = [format_csv_value(value) for value in row]
-        writer.writerow(formatted_row)
+    # Write data rows, handing out the buffer every batch_size rows
+    for count, row in enumerate(rows, 1):
+        writer.writerow([format_csv_value(value) for value in row])
+
+        if count % batch_size == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+
+    yield output.getvalue()
+
+
+def generate_csv_file(headers: List[str], rows: Iterable[List[Any]]) -> str:
+    """
+    Generate a CSV file as a string
+
+    Parameters:
+    - headers: List of column headers
+    - rows: List of rows, each containing values for each column
 
-    return output.getvalue()
+    Returns:
+    - CSV content as a string
+    """
+    return "".join(iter_csv(headers, rows))
 
 
 def dict_to_csv(data: List[Dict[str, Any]], fields: Optional[List[str]] = None) -> str:
@@ -59,12 +78,7 @@ def dict_to_csv(data: List[Dict[str, Any]], fields: Optional[List[str]] = None)
     if fields is None:
         fields = list(data[0].keys())
 
-    # Generate rows
-    rows = []
-    for item in data:
-        row = []
-        for field in fields:
-            row.append(item.get(field))
-        rows.append(row)
+    # Generate rows as they are written
+    rows = ([item.get(field) for field in fields] for item in data)
 
-    return generate_csv_file(fields, rows)
\ No newline at end of file
+    return generate_csv_file(fields, rows)
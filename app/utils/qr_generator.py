@@ -1,11 +1,17 @@
 import qrcode
 import io
 import base64
-from typing import Optional
+from typing import Optional, Union
 from app.core.config import settings
 
 
-def generate_qr_code(data: str, box_size: Optional[int] = None, border: Optional[int] = None) -> str:
+def generate_qr_code(
+        data: str,
+        box_size: Optional[int] = None,
+        border: Optional[int] = None,
+        *,
+        as_data_uri: bool = True
+) -> Union[str, bytes]:
     """
     Generate a QR code as a base64 encoded image
 
@@ -13,9 +19,11 @@ def generate_qr_code(data: str, box_size: Optional[int] = None, border: Optional
     - data: Data to encode in the QR code
     - box_size: Size of each box in the QR code
     - border: Border size around the QR code
+    - as_data_uri: Return a base64 data URI; False returns the raw PNG bytes
+      (e.g. for a Response body) and skips the base64 pass
 
     Returns:
-    - Base64 encoded QR code image
+    - Base64 encoded QR code image, or PNG bytes
     """
     # Set default values if not provided
     box_size = box_size or settings.QR_CODE_BOX_SIZE
@@ -43,6 +51,9 @@ def generate_qr_code(data: str, box_size: Optional[int] = None, border: Optional
     # Get the bytes value from the buffer
     img_bytes = buffer.getvalue()
 
+    if not as_data_uri:
+        return img_bytes
+
     # Encode the bytes as base64
     img_base64 = base64.b64encode(img_bytes).decode()
 
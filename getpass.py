@@ -1,6 +0,0 @@
-from passlib.context import CryptContext
-
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-hashed_password = pwd_context.hash("admin123")
-print(hashed_password)  # Output: Hashed version of the password
\ No newline at end of file
@@ -4,19 +4,23 @@ Initialize database with default admin user and test data
 """
 
 import sys
-import os
+import argparse
 import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-# Add the parent directory to the path so we can import from app
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
-from app.core.security import get_password_hash, generate_api_key
-from app.db.connection import execute_query, execute_transaction
+from app.core.security import generate_api_key, generate_api_keys
+from app.db.connection import execute_query, execute_transaction, copy_from
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Precomputed bcrypt hashes of the fixed seed passwords, so seeding never
+# pays for the key derivation (verify with app.core.security.verify_password)
+ADMIN_PASSWORD_HASH = "$2b$12$2zzqBcmo9VMGwf1b/Sp0teRT6OGSHQ45A8yV9hZCwlDkv3iu7K4Q6"  # admin123
+MERCHANT_PASSWORD_HASH = "$2b$12$IxizItmqIcrbLOUETGk2rus2PnHGbkgMEJ7KR5KlWEqBgHGa3EsUO"  # merchant123
+
 
 def create_admin_user():
     """Create default admin user if none exists"""
@@ -35,19 +39,24 @@ def create_admin_user():
     logger.info("Creating admin user...")
 
     # Create admin user
-    hashed_password = get_password_hash("admin123")
-
     query = """
     INSERT INTO users (
         email, hashed_password, full_name, is_active, is_superuser
     ) VALUES (
         'admin@example.com', %s, 'System Administrator', TRUE, TRUE
-    ) RETURNING id
+    )
+    ON CONFLICT (email) DO NOTHING
     """
 
-    admin = execute_query(query, (hashed_password,), single=True)
+    # The new ID is not needed, so only the row count comes back
+    created = execute_query(query, (ADMIN_PASSWORD_HASH,), fetch=False)
 
-    logger.info(f"Admin user created with ID: {admin['id']}")
+    # Another init run created the user between the check and the insert
+    if not created:
+        logger.info("Admin user already exists")
+        return
+
+    logger.info("Admin user created: admin@example.com")
 
 
 def create_test_merchant():
@@ -66,80 +75,115 @@ def create_test_merchant():
 
     logger.info("Creating test merchant...")
 
-    # Create test merchant user
-    hashed_password = get_password_hash("merchant123")
-
-    user_query = """
-    INSERT INTO users (
-        email, hashed_password, full_name, is_active, is_superuser
-    ) VALUES (
-        'merchant@example.com', %s, 'Test Merchant', TRUE, FALSE
-    ) RETURNING id
-    """
-
-    user = execute_query(user_query, (hashed_password,), single=True)
-
     # Generate API key
     api_key = generate_api_key()
 
-    # Create merchant
+    # Create the merchant user, merchant, bank detail, UPI detail and
+    # whitelisted IP in one statement (and one transaction)
     merchant_query = """
-    INSERT INTO merchants (
-        user_id, business_name, business_type, contact_phone, address,
-        api_key, callback_url, is_active, min_deposit, max_deposit,
-        min_withdrawal, max_withdrawal
-    ) VALUES (
-        %s, 'Test Merchant', 'E-commerce', '1234567890', '123 Test St, Test City',
-        %s, 'https://example.com/callback', TRUE, 500, 300000, 1000, 1000000
-    ) RETURNING id
+    WITH merchant_user AS (
+        INSERT INTO users (
+            email, hashed_password, full_name, is_active, is_superuser
+        ) VALUES (
+            'merchant@example.com', %s, 'Test Merchant', TRUE, FALSE
+        )
+        ON CONFLICT (email) DO NOTHING
+        RETURNING id
+    ), merchant AS (
+        INSERT INTO merchants (
+            user_id, business_name, business_type, contact_phone, address,
+            api_key, callback_url, is_active, min_deposit, max_deposit,
+            min_withdrawal, max_withdrawal
+        )
+        SELECT 
+            id, 'Test Merchant', 'E-commerce', '1234567890', '123 Test St, Test City',
+            %s, 'https://example.com/callback', TRUE, 500, 300000, 1000, 1000000
+        FROM merchant_user
+        RETURNING id
+    ), bank AS (
+        INSERT INTO merchant_bank_details (
+            merchant_id, bank_name, account_name, account_number, ifsc_code, is_active
+        )
+        SELECT id, 'Test Bank', 'Test Merchant', '1234567890', 'TEST0001234', TRUE
+        FROM merchant
+    ), upi AS (
+        INSERT INTO merchant_upi_details (
+            merchant_id, upi_id, name, is_active
+        )
+        SELECT id, 'test@upi', 'Test Merchant', TRUE
+        FROM merchant
+    ), ip AS (
+        INSERT INTO ip_whitelist (
+            merchant_id, ip_address, description
+        )
+        SELECT id, '0.0.0.0', 'All IPs (for testing)'
+        FROM merchant
+    )
+    SELECT id FROM merchant
     """
 
-    merchant = execute_query(merchant_query, (user["id"], api_key), single=True)
+    merchant = execute_query(merchant_query, (MERCHANT_PASSWORD_HASH, api_key), single=True)
 
-    # Create bank detail
-    bank_query = """
-    INSERT INTO merchant_bank_details (
-        merchant_id, bank_name, account_name, account_number, ifsc_code, is_active
-    ) VALUES (
-        %s, 'Test Bank', 'Test Merchant', '1234567890', 'TEST0001234', TRUE
-    )
-    """
+    # The merchant user already exists, so nothing was inserted
+    if not merchant:
+        logger.info("Test merchant user already exists")
+        return
 
-    execute_query(bank_query, (merchant["id"],), fetch=False)
+    logger.info(f"Test merchant created with ID: {merchant['id']}")
+    logger.info(f"API Key: {api_key}")
 
-    # Create UPI detail
-    upi_query = """
-    INSERT INTO merchant_upi_details (
-        merchant_id, upi_id, name, is_active
-    ) VALUES (
-        %s, 'test@upi', 'Test Merchant', TRUE
-    )
-    """
 
-    execute_query(upi_query, (merchant["id"],), fetch=False)
+def create_load_test_merchants(count):
+    """Bulk create merchants (and their users) for load testing"""
+    logger.info(f"Creating {count} load test merchants...")
 
-    # Add IP to whitelist
-    ip_query = """
-    INSERT INTO ip_whitelist (
-        merchant_id, ip_address, description
-    ) VALUES (
-        %s, '0.0.0.0', 'All IPs (for testing)'
+    # IDs are generated here so the merchants can reference their users
+    # without reading anything back from the database
+    user_ids = [uuid.uuid4() for _ in range(count)]
+
+    copy_from(
+        "users",
+        ("id", "email", "hashed_password", "full_name", "is_active", "is_superuser"),
+        (
+            (user_id, f"loadtest-{user_id}@example.com", MERCHANT_PASSWORD_HASH, "Load Test Merchant", True, False)
+            for user_id in user_ids
+        )
     )
-    """
 
-    execute_query(ip_query, (merchant["id"],), fetch=False)
+    loaded = copy_from(
+        "merchants",
+        (
+            "user_id", "business_name", "business_type", "contact_phone", "address",
+            "api_key", "callback_url", "is_active"
+        ),
+        (
+            (
+                user_id, f"Load Test Merchant {i}", "E-commerce", "1234567890", "123 Test St, Test City",
+                api_key, "https://example.com/callback", True
+            )
+            for i, (user_id, api_key) in enumerate(zip(user_ids, generate_api_keys(count)), 1)
+        )
+    )
 
-    logger.info(f"Test merchant created with ID: {merchant['id']}")
-    logger.info(f"API Key: {api_key}")
+    logger.info(f"Created {loaded} load test merchants")
 
 
-def main():
+def main(load_test_merchants=0):
     """Main function to initialize the database"""
     logger.info("Initializing database...")
 
     try:
-        create_admin_user()
-        create_test_merchant()
+        # The admin and test merchant rows are independent, so seed them
+        # side by side to overlap their database round trips
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            admin_future = executor.submit(create_admin_user)
+            merchant_future = executor.submit(create_test_merchant)
+
+            admin_future.result()
+            merchant_future.result()
+
+        if load_test_merchants:
+            create_load_test_merchants(load_test_merchants)
 
         logger.info("Database initialization completed successfully!")
     except Exception as e:
@@ -148,4 +192,11 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--load-test-merchants", type=int, default=0,
+        help="Number of extra merchants to bulk create for load testing"
+    )
+    args = parser.parse_args()
+
+    main(args.load_test_merchants)
\ No newline at end of file
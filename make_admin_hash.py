@@ -0,0 +1,19 @@
+#!/usr/bin/env python
+"""
+Print the bcrypt hash of a password, e.g. for seeding an admin user by hand
+"""
+
+import argparse
+
+from passlib.context import CryptContext
+
+# Same scheme as app.core.security, with the cost spelled out
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=12)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--password", default="admin123", help="Password to hash")
+    args = parser.parse_args()
+
+    print(pwd_context.hash(args.password))  # Output: Hashed version of the password
@@ -1,6 +1,9 @@
 -- Create extension for UUID generation
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
+-- Create extension for server-side random transaction hash keys
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+
 -- Create users table
 CREATE TABLE users (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -29,6 +32,7 @@ CREATE TABLE merchants (
     max_deposit INTEGER NOT NULL DEFAULT 300000,
     min_withdrawal INTEGER NOT NULL DEFAULT 1000,
     max_withdrawal INTEGER NOT NULL DEFAULT 1000000,
+    batched_webhooks BOOLEAN NOT NULL DEFAULT FALSE,
     created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
 );
@@ -137,7 +141,11 @@ CREATE INDEX idx_payments_status ON payments(status);
 CREATE INDEX idx_payments_created_at ON payments(created_at);
 CREATE INDEX idx_payments_trxn_hash_key ON payments(trxn_hash_key);
 CREATE INDEX idx_payments_utr_number ON payments(utr_number);
+CREATE INDEX idx_payments_pending_created_at ON payments(created_at DESC, id DESC) WHERE status = 'PENDING';
+CREATE INDEX idx_payments_merchant_created_at_id ON payments(merchant_id, created_at DESC, id DESC);
+CREATE INDEX idx_payments_confirmed_created_at ON payments(created_at) INCLUDE (id, merchant_id, amount, payment_type) WHERE status = 'CONFIRMED';
 CREATE INDEX idx_merchant_user_id ON merchants(user_id);
+CREATE INDEX idx_merchants_created_at_id ON merchants(created_at DESC, id DESC);
 
 -- Create function to update the updated_at timestamp
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -264,5 +272,32 @@ CREATE TABLE transaction_fees (
 );
 
 -- Create index on transaction_fees
-CREATE INDEX idx_transaction_fees_payment_id ON transaction_fees(payment_id);
-CREATE INDEX idx_transaction_fees_merchant_id ON transaction_fees(merchant_id);
\ No newline at end of file
+CREATE INDEX idx_transaction_fees_payment_id ON transaction_fees(payment_id)
+    INCLUDE (merchant_id, original_amount, fee_amount, final_amount, commission_rate);
+CREATE INDEX idx_transaction_fees_merchant_id ON transaction_fees(merchant_id);
+
+-- Processed payments whose webhook has not been delivered yet, oldest first
+-- (see webhook_service.process_failed_webhooks)
+CREATE INDEX idx_payments_callback_retry ON payments(updated_at)
+    WHERE callback_sent = FALSE AND status IN ('CONFIRMED', 'DECLINED');
+
+-- Admin users, so the seed's admin existence check is an index-only lookup
+-- (see init_data.create_admin_user)
+CREATE INDEX idx_users_superuser ON users(id) WHERE is_superuser = TRUE;
+
+-- A UTR can confirm at most one payment
+CREATE UNIQUE INDEX idx_payments_confirmed_utr_number ON payments(utr_number) WHERE status = 'CONFIRMED';
+
+-- Daily payment counts for the admin dashboard; refreshed in the background
+-- by the app (see report_service.refresh_report_views). refreshed_at records
+-- the refresh, so days after it are read from the live table instead.
+CREATE MATERIALIZED VIEW mv_daily_payment_stats AS
+SELECT
+    DATE(created_at) AS date,
+    COUNT(*) AS count,
+    COUNT(*) FILTER (WHERE status = 'CONFIRMED') AS confirmed,
+    NOW() AS refreshed_at
+FROM payments
+GROUP BY DATE(created_at);
+
+CREATE UNIQUE INDEX idx_mv_daily_payment_stats_date ON mv_daily_payment_stats(date);
@@ -0,0 +1,99 @@
+-- Bring a database created from an older sql/init.sql up to date.
+-- Every statement is idempotent, so the script is safe to re-run.
+-- Indexes are built CONCURRENTLY so payments stay writable; run the script
+-- outside a transaction (psql -f, without -1 / --single-transaction).
+
+-- Stop at the first failed check instead of running the rest of the script
+\set ON_ERROR_STOP on
+
+-- Create extension for server-side random transaction hash keys
+CREATE EXTENSION IF NOT EXISTS pgcrypto;
+
+-- Opt merchants into batched webhook delivery
+ALTER TABLE merchants ADD COLUMN IF NOT EXISTS batched_webhooks BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Daily payment counts for the admin dashboard (see sql/init.sql);
+-- rebuilt so older definitions gain the refreshed_at column
+DROP MATERIALIZED VIEW IF EXISTS mv_daily_payment_stats;
+
+CREATE MATERIALIZED VIEW mv_daily_payment_stats AS
+SELECT
+    DATE(created_at) AS date,
+    COUNT(*) AS count,
+    COUNT(*) FILTER (WHERE status = 'CONFIRMED') AS confirmed,
+    NOW() AS refreshed_at
+FROM payments
+GROUP BY DATE(created_at);
+
+CREATE UNIQUE INDEX idx_mv_daily_payment_stats_date ON mv_daily_payment_stats(date);
+
+-- The btree idx_payments_created_at already serves created_at range scans
+DROP INDEX IF EXISTS idx_payments_created_at_brin;
+
+-- Indexes added to sql/init.sql since the original schema
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_merchant_created_at_id
+    ON payments(merchant_id, created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_merchants_created_at_id
+    ON merchants(created_at DESC, id DESC);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_callback_retry ON payments(updated_at)
+    WHERE callback_sent = FALSE AND status IN ('CONFIRMED', 'DECLINED');
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_users_superuser ON users(id) WHERE is_superuser = TRUE;
+
+-- Indexes whose definition grew: drop versions built with fewer columns
+-- so they are recreated below with the current definition
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_index
+        WHERE indexrelid = to_regclass('idx_payments_pending_created_at') AND indnatts < 2
+    ) THEN
+        DROP INDEX idx_payments_pending_created_at;
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM pg_index
+        WHERE indexrelid = to_regclass('idx_transaction_fees_payment_id') AND indnatts < 6
+    ) THEN
+        DROP INDEX idx_transaction_fees_payment_id;
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM pg_index
+        WHERE indexrelid = to_regclass('idx_payments_confirmed_created_at') AND indnatts < 5
+    ) THEN
+        DROP INDEX idx_payments_confirmed_created_at;
+    END IF;
+END $$;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_pending_created_at
+    ON payments(created_at DESC, id DESC) WHERE status = 'PENDING';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transaction_fees_payment_id ON transaction_fees(payment_id)
+    INCLUDE (merchant_id, original_amount, fee_amount, final_amount, commission_rate);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_confirmed_created_at ON payments(created_at)
+    INCLUDE (id, merchant_id, amount, payment_type) WHERE status = 'CONFIRMED';
+
+-- A UTR can confirm at most one payment. Older databases may already hold
+-- duplicates, which would make the unique index fail; stop with the list so
+-- they can be resolved by hand (no payment is changed automatically):
+--   SELECT utr_number, array_agg(reference) FROM payments
+--   WHERE status = 'CONFIRMED' AND utr_number IS NOT NULL
+--   GROUP BY utr_number HAVING COUNT(*) > 1;
+DO $$
+DECLARE
+    duplicates TEXT;
+BEGIN
+    SELECT string_agg(utr_number, ', ') INTO duplicates
+    FROM (
+        SELECT utr_number FROM payments
+        WHERE status = 'CONFIRMED' AND utr_number IS NOT NULL
+        GROUP BY utr_number
+        HAVING COUNT(*) > 1
+    ) d;
+
+    IF duplicates IS NOT NULL THEN
+        RAISE EXCEPTION 'UTR numbers confirmed on more than one payment: %', duplicates;
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_payments_confirmed_utr_number
+    ON payments(utr_number) WHERE status = 'CONFIRMED';
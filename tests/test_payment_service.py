@@ -0,0 +1,100 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.schemas.payment import PaymentResponse, CheckRequestResponse
+from app.services import payment_service
+
+CREATED_AT = datetime(2024, 5, 1, 10, 30, 15, 123456, tzinfo=timezone.utc)
+
+LIMITS = {
+    "min_deposit": 100, "max_deposit": 100000,
+    "min_withdrawal": 100, "max_withdrawal": 100000,
+    "callback_url": None, "webhook_secret": None,
+}
+
+PAYMENT_DATA = {
+    "action": "DEPOSIT",
+    "reference": "REF1",
+    "amount": 500,
+    "currency": "INR",
+    "return_url": "",
+    "ae_type": "1",
+    "bank": "HDFC",
+    "bank_ifsc": "HDFC0001",
+    "account_name": "Player",
+    "account_number": "12345",
+}
+
+
+@pytest.fixture
+def inserted(monkeypatch):
+    row = {"id": "pay-1", "trxn_hash_key": "a" * 24, "created_at": CREATED_AT}
+    monkeypatch.setattr(payment_service, "_get_merchant", lambda merchant_id: LIMITS)
+    monkeypatch.setattr(payment_service, "execute_prepared", lambda statement, params, single=False: row)
+    return row
+
+
+def _wire(response):
+    # What the endpoint sends: validated by the response model, unset fields left out
+    return PaymentResponse.model_validate(response).model_dump(exclude_unset=True)
+
+
+@pytest.mark.parametrize("payment_data, keys", [
+    (
+        {"ae_type": "1"},
+        {"paymentMethod", "receiverInfo", "upiLink", "paymentPageUrl", "trxnHashKey", "amount", "requestedDate"},
+    ),
+    (
+        {"ae_type": "2"},
+        {"paymentMethod", "receiverBankInfo", "paymentPageUrl", "trxnHashKey", "amount", "requestedDate"},
+    ),
+    (
+        {"action": "WITHDRAWAL"},
+        {"receiverBankInfo", "trxnHashKey", "amount", "requestedDate"},
+    ),
+])
+def test_create_payment_request_response_shape(inserted, payment_data, keys):
+    inserted.update({
+        "upi_id": "merchant@upi", "name": "Merchant",
+        "bank_name": "SBI", "account_name": "Merchant", "account_number": "999", "ifsc_code": "SBIN0001",
+    })
+
+    response = payment_service.create_payment_request("m-1", {**PAYMENT_DATA, **payment_data})
+    wire = _wire(response)
+
+    assert wire["status"] == 201
+    assert set(wire["response"]) == keys
+    assert wire["response"]["amount"] == "500"
+    assert wire["response"]["requestedDate"] == CREATED_AT.isoformat()
+
+
+def test_check_payment_request_date_format(monkeypatch):
+    monkeypatch.setattr(payment_service, "execute_prepared", lambda statement, params, single=False: {
+        "transaction_id": "pay-1", "reference": "REF1", "type": "DEPOSIT",
+        "status": "PENDING", "remarks": None, "requested_date": CREATED_AT,
+    })
+
+    response = CheckRequestResponse.model_validate(payment_service.check_payment_request("a" * 24))
+
+    assert response.response.requestedDate == "2024-05-01 10:30:15"
+    assert response.response.remarks == ""
+
+
+def test_pending_payments_page_reports_next_cursor(monkeypatch):
+    rows = [{"id": f"pay-{n}", "created_at": CREATED_AT} for n in (3, 2, 1)]
+    queries = []
+
+    def execute_query(query, params):
+        queries.append((query, params))
+        return rows[:params[-1]]
+
+    monkeypatch.setattr(payment_service, "execute_query", execute_query)
+
+    page = payment_service.get_pending_payments(limit=2, cursor_created_at=CREATED_AT, cursor_id="pay-4")
+
+    assert [payment["id"] for payment in page["items"]] == ["pay-3", "pay-2"]
+    assert page["has_more"] is True
+    assert (page["next_cursor_created_at"], page["next_cursor_id"]) == (CREATED_AT, "pay-2")
+    assert "(p.created_at, p.id) < (%s, %s)" in queries[0][0]
+    assert queries[0][1][-3:] == (CREATED_AT, "pay-4", 3)
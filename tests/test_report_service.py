@@ -0,0 +1,10 @@
+from app.services.report_service import _crlf_chunks
+
+
+def test_crlf_chunks_matches_csv_module_row_endings():
+    # A quoted field with a newline and a quote pair split across chunks
+    chunks = [b'ID,Remarks\n1,"line one\nline ', b'two ""x"""\n2,\n']
+
+    assert b"".join(_crlf_chunks(chunks)) == (
+        b'ID,Remarks\r\n1,"line one\nline two ""x"""\r\n2,\r\n'
+    )
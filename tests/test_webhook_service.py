@@ -0,0 +1,129 @@
+import asyncio
+
+import orjson
+
+from app.services import webhook_service
+
+
+class FakeResponse:
+    def __init__(self, status: int, text: str):
+        self.status = status
+        self._text = text
+
+    async def text(self) -> str:
+        return self._text
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.posts = []
+        self.bodies = []
+
+    def post(self, url, **kwargs):
+        self.posts.append(url)
+        self.bodies.append(kwargs.get("data"))
+        status = self.statuses.pop(0)
+        return FakeResponse(status, "ok" if status < 300 else "server error")
+
+
+class FakePayments:
+    """In-memory stand-in for the payments rows the webhook queries touch"""
+
+    def __init__(self, rows):
+        self.rows = {row["id"]: row for row in rows}
+
+    def execute_query(self, query, params=None, fetch=True):
+        if query.lstrip().upper().startswith("UPDATE"):
+            for payment_id in params["ids"]:
+                row = self.rows[payment_id]
+                row["callback_sent"] = row["callback_sent"] or params["sent"]
+                row["callback_response"] = params["response"]
+                row["callback_attempts"] = params["attempt"]
+            return None
+
+        # process_failed_webhooks selection
+        return [
+            dict(row) for row in self.rows.values()
+            if row["callback_sent"] is False and row["callback_attempts"] < params[0]
+        ]
+
+
+def test_5xx_delivery_is_retried_by_process_failed_webhooks(monkeypatch):
+    payments = FakePayments([{
+        "id": "pay-1",
+        "merchant_id": "m-1",
+        "reference": "REF1",
+        "amount": 100,
+        "status": "CONFIRMED",
+        "callback_sent": False,
+        "callback_response": None,
+        "callback_attempts": 0,
+        "callback_url": "https://merchant.example/hook",
+        "webhook_secret": None,
+        "batched_webhooks": False,
+    }])
+    session = FakeSession([500, 200])
+
+    async def no_retry(*args, **kwargs):
+        return None
+
+    monkeypatch.setattr(webhook_service, "execute_query", payments.execute_query)
+    monkeypatch.setattr(webhook_service, "get_webhook_session", lambda: session)
+    monkeypatch.setattr(webhook_service, "retry_webhook", no_retry)
+    monkeypatch.setattr(webhook_service.settings, "WEBHOOK_RETRY_ATTEMPTS", 3)
+
+    async def run():
+        sent = await webhook_service.send_webhook(
+            "https://merchant.example/hook", {"reference_id": "REF1"}, None, "pay-1"
+        )
+        assert sent is False
+        assert payments.rows["pay-1"]["callback_sent"] is False
+        assert payments.rows["pay-1"]["callback_attempts"] == 1
+        assert payments.rows["pay-1"]["callback_response"] == "server error"
+
+        await webhook_service.process_failed_webhooks()
+
+    asyncio.run(run())
+
+    assert len(session.posts) == 2
+    assert payments.rows["pay-1"]["callback_sent"] is True
+    assert payments.rows["pay-1"]["callback_attempts"] == 2
+
+
+def test_batched_merchant_retries_are_sent_as_one_events_envelope(monkeypatch):
+    payments = FakePayments([
+        {
+            "id": f"pay-{n}",
+            "merchant_id": "m-1",
+            "reference": f"REF{n}",
+            "amount": 100,
+            "status": "CONFIRMED",
+            "callback_sent": False,
+            "callback_response": "server error",
+            "callback_attempts": n,
+            "callback_url": "https://merchant.example/hook",
+            "webhook_secret": None,
+            "batched_webhooks": True,
+        }
+        for n in (1, 2)
+    ])
+    session = FakeSession([200])
+
+    monkeypatch.setattr(webhook_service, "execute_query", payments.execute_query)
+    monkeypatch.setattr(webhook_service, "get_webhook_session", lambda: session)
+    monkeypatch.setattr(webhook_service.settings, "WEBHOOK_RETRY_ATTEMPTS", 3)
+
+    asyncio.run(webhook_service.process_failed_webhooks())
+
+    assert len(session.posts) == 1
+    events = orjson.loads(session.bodies[0])["events"]
+    assert [event["reference_id"] for event in events] == ["REF1", "REF2"]
+    assert all(row["callback_sent"] is True for row in payments.rows.values())
+    assert all(row["callback_attempts"] == 3 for row in payments.rows.values())